@@ -1,6 +1,8 @@
 import sqlite3
 import os
 
+from security.passwords import hash_password
+
 def add_doctor():
     """إضافة طبيب جديد إلى قاعدة البيانات"""
     # الاتصال بقاعدة البيانات
@@ -24,7 +26,7 @@ def add_doctor():
         
         # إضافة الطبيب
         cursor.execute("INSERT INTO users (username, password, role) VALUES (?, ?, ?)", 
-                      (username, password, role))
+                      (username, hash_password(password), role))
         
         # حفظ التغييرات
         user_id = cursor.lastrowid
@@ -0,0 +1,237 @@
+"""
+بناء ملفات الواجهة - Static asset build
+
+The pages keep their CSS and JavaScript inline in templates/*.html. The
+build moves every inline <style> and <script> block of a template into a
+minified file named after its content hash (static/dist/home.3f2a9c1b.css),
+writes gzip and brotli copies next to it, and writes the template with
+<link>/<script src> tags into templates/dist/. Hashed names never change
+content, so they are served with immutable cache headers; a new build gives
+new names.
+
+static/dist/manifest.json records the hash of every source template. At
+startup templates_dir() serves templates/dist/ only while it matches the
+sources, so a template edited after the last build is never hidden by a
+stale copy.
+
+Minification uses rcssmin / rjsmin when installed and otherwise a
+conservative built-in pass (comments, indentation, blank lines). Brotli
+copies need the brotli package.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from rcssmin import cssmin as _cssmin
+except ImportError:
+    _cssmin = None
+
+try:
+    from rjsmin import jsmin as _jsmin
+except ImportError:
+    _jsmin = None
+
+logger = logging.getLogger(__name__)
+
+DIST = "dist"
+MANIFEST = "manifest.json"
+STATIC_URL = "/static/dist/"
+
+_STYLE = re.compile(r"<style>(.*?)</style>", re.S | re.I)
+# Inline scripts only: <script> without attributes
+_SCRIPT = re.compile(r"<script>(.*?)</script>", re.S | re.I)
+_CSS_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+_CSS_SPACE = re.compile(r"\s+")
+_CSS_PUNCTUATION = re.compile(r"\s*([{};,])\s*")
+
+
+def minify_css(css):
+    if _cssmin is not None:
+        return _cssmin(css)
+    css = _CSS_COMMENT.sub("", css)
+    css = _CSS_SPACE.sub(" ", css)
+    # Not around ':' - "a :hover" and "a:hover" are different selectors
+    css = _CSS_PUNCTUATION.sub(r"\1", css)
+    return css.replace(";}", "}").strip()
+
+
+def minify_js(js):
+    """
+    Without rjsmin only whole-line // comments, indentation and blank
+    lines are removed: anything finer needs a real JavaScript tokenizer.
+    """
+    if _jsmin is not None:
+        return _jsmin(js)
+    lines = []
+    for line in js.splitlines():
+        line = line.strip()
+        if line and not line.startswith("//"):
+            lines.append(line)
+    return "\n".join(lines)
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:8]
+
+
+def write_asset(dist_dir, stem, extension, text):
+    """Write a hashed asset and its .gz/.br copies; returns its file name"""
+    data = text.encode("utf-8")
+    name = f"{stem}.{content_hash(data)}.{extension}"
+    path = os.path.join(dist_dir, name)
+    with open(path, "wb") as f:
+        f.write(data)
+    # mtime=0: the same input always gives the same .gz bytes
+    with open(path + ".gz", "wb") as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + ".br", "wb") as f:
+            f.write(brotli.compress(data, quality=11))
+    return name
+
+
+def build_template(source, stem, dist_dir):
+    """Move the inline assets of one template into hashed files; returns (html, asset names)"""
+    assets = []
+
+    styles = [match.group(1) for match in _STYLE.finditer(source)]
+    if styles:
+        name = write_asset(dist_dir, stem, "css", minify_css("\n".join(styles)))
+        assets.append(name)
+        link = f'<link rel="stylesheet" href="{STATIC_URL}{name}">'
+        # The first <style> becomes the <link>, any later ones are dropped
+        start, end = _STYLE.search(source).span()
+        source = source[:start] + link + _STYLE.sub("", source[end:])
+
+    scripts = []
+
+    def replace_script(match):
+        scripts.append(match)
+        name = write_asset(dist_dir, stem if len(scripts) == 1 else f"{stem}-{len(scripts)}", "js",
+                           minify_js(match.group(1)))
+        assets.append(name)
+        return f'<script src="{STATIC_URL}{name}"></script>'
+
+    source = _SCRIPT.sub(replace_script, source)
+    return source, assets
+
+
+def remove_old_assets(dist_dir, keep):
+    for name in os.listdir(dist_dir):
+        base = name[:-3] if name.endswith((".gz", ".br")) else name
+        if base not in keep and name != MANIFEST:
+            os.remove(os.path.join(dist_dir, name))
+
+
+def source_templates(template_dir):
+    """Names of the templates a full build covers (empty files are skipped)"""
+    names = []
+    for name in sorted(os.listdir(template_dir)):
+        path = os.path.join(template_dir, name)
+        if not name.endswith(".html") or not os.path.isfile(path):
+            continue
+        with open(path, "rb") as f:
+            if f.read().strip():
+                names.append(name)
+    return names
+
+
+def read_manifest(static_dist):
+    try:
+        with open(os.path.join(static_dist, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def build(base_dir, templates=None):
+    """
+    Build every template of templates/ (or only the given names).
+    A partial build merges its entries into the existing manifest, so the
+    other templates keep their assets. Returns the entries built:
+    {template: {"source": hash, "assets": [...]}}.
+    """
+    template_dir = os.path.join(base_dir, "templates")
+    static_dist = os.path.join(base_dir, "static", DIST)
+    template_dist = os.path.join(template_dir, DIST)
+    os.makedirs(static_dist, exist_ok=True)
+    os.makedirs(template_dist, exist_ok=True)
+
+    sources = source_templates(template_dir)
+    if templates:
+        manifest = read_manifest(static_dist) or {}
+        # Forget templates deleted since the last build
+        manifest = {name: entry for name, entry in manifest.items() if name in sources}
+    else:
+        manifest = {}
+        templates = sources
+
+    built = {}
+    for name in templates:
+        with open(os.path.join(template_dir, name), "rb") as f:
+            raw = f.read()
+        if not raw.strip():
+            continue
+        html, assets = build_template(raw.decode("utf-8"), os.path.splitext(name)[0], static_dist)
+        with open(os.path.join(template_dist, name), "w", encoding="utf-8", newline="") as f:
+            f.write(html)
+        built[name] = {"source": content_hash(raw), "assets": assets}
+    manifest.update(built)
+
+    # Only assets no template of the merged manifest refers to any more
+    remove_old_assets(static_dist, {asset for entry in manifest.values() for asset in entry["assets"]})
+    for name in os.listdir(template_dist):
+        if name.endswith(".html") and name not in manifest:
+            os.remove(os.path.join(template_dist, name))
+    with open(os.path.join(static_dist, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return built
+
+
+def templates_dir(base_dir):
+    """
+    "templates/dist" when a build exists and matches every source template,
+    otherwise "templates" (relative, like the rest of main.py's paths).
+    Every source template and every built one must have a manifest entry,
+    and every asset it lists must exist.
+    """
+    static_dist = os.path.join(base_dir, "static", DIST)
+    manifest = read_manifest(static_dist)
+    if manifest is None:
+        return "templates"
+    template_dir = os.path.join(base_dir, "templates")
+    try:
+        built = {name for name in os.listdir(os.path.join(template_dir, DIST)) if name.endswith(".html")}
+    except OSError:
+        built = set()
+    expected = set(source_templates(template_dir))
+    if built != set(manifest) or expected != set(manifest):
+        logger.warning("The asset build does not cover the current templates; serving the unbuilt templates "
+                       "(run build_assets.py)")
+        return "templates"
+    missing = [asset for entry in manifest.values() for asset in entry["assets"]
+               if not os.path.isfile(os.path.join(static_dist, asset))]
+    if missing:
+        logger.warning("Built assets are missing (%s); serving the unbuilt templates (run build_assets.py)",
+                       ", ".join(missing))
+        return "templates"
+    for name, entry in manifest.items():
+        try:
+            with open(os.path.join(base_dir, "templates", name), "rb") as f:
+                current = content_hash(f.read())
+        except OSError:
+            current = None
+        if current != entry["source"]:
+            logger.warning("templates/%s changed since the last asset build; serving the unbuilt templates "
+                           "(run build_assets.py)", name)
+            return "templates"
+    return os.path.join("templates", DIST)
@@ -0,0 +1,50 @@
+"""
+التفاوض على ترميز المحتوى - Accept-Encoding negotiation
+
+Parses the q-values of an Accept-Encoding header (RFC 9110, 12.5.3): a
+coding with q=0 is refused, and "*" stands for every coding not listed.
+Used by NegotiatingGZipMiddleware and the page cache responses, and by
+PrecompressedStaticFiles to pick a precompressed copy the client really
+accepts.
+"""
+
+
+def parse_accept_encoding(header):
+    """{coding: q} of an Accept-Encoding header value (names lower-cased)"""
+    accepted = {}
+    for part in header.lower().split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = min(max(q, 0.0), 1.0)
+    return accepted
+
+
+def encoding_quality(accepted, coding):
+    """q of coding in a parsed header; 0 when it is refused or not accepted"""
+    if coding in accepted:
+        return accepted[coding]
+    return accepted.get("*", 0.0)
+
+
+def choose_encoding(header, codings):
+    """
+    The coding of codings (in server preference order) the client prefers,
+    or None when it accepts none of them. Ties keep the server's order.
+    """
+    accepted = parse_accept_encoding(header or "")
+    best, best_q = None, 0.0
+    for coding in codings:
+        q = encoding_quality(accepted, coding)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
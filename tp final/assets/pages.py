@@ -0,0 +1,96 @@
+"""
+ذاكرة الصفحات المعروضة - Rendered page cache
+
+The HTML pages depend on almost nothing from the request, so PageCache
+renders each (template, template mtime, context) once and keeps the result
+as UTF-8 bytes plus a gzip copy and an ETag. The template file is stat()ed
+on every lookup: editing it on disk (or rebuilding the assets) changes its
+mtime, which makes a new key and a fresh render.
+
+Only the context passed to get() is given to the template, and it is the
+cache key: a page must not show anything that is not in it.
+
+Compiled templates are also kept in a Jinja bytecode cache on disk, so
+each worker process skips template compilation on its first render.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from jinja2 import FileSystemBytecodeCache
+
+
+class CachedPage:
+    """A rendered page: body, gzip_body and their ETags"""
+
+    __slots__ = ("body", "gzip_body", "etag", "gzip_etag")
+
+    def __init__(self, html, gzip_level=6):
+        self.body = html.encode("utf-8")
+        # mtime=0: the same page always gives the same gzip bytes
+        self.gzip_body = gzip.compress(self.body, compresslevel=gzip_level, mtime=0)
+        digest = hashlib.sha256(self.body).hexdigest()[:16]
+        self.etag = f'"{digest}"'
+        self.gzip_etag = f'"{digest}-gz"'
+
+
+class PageCache:
+    """LRU cache of rendered pages for a Jinja2Templates instance"""
+
+    def __init__(self, templates, max_size=64, bytecode_cache_dir=None, gzip_level=6):
+        self.env = templates.env
+        if bytecode_cache_dir:
+            os.makedirs(bytecode_cache_dir, exist_ok=True)
+            self.env.bytecode_cache = FileSystemBytecodeCache(bytecode_cache_dir)
+        else:
+            # Jinja's default: a per-user directory under the system temp dir
+            self.env.bytecode_cache = FileSystemBytecodeCache()
+        self.directories = list(self.env.loader.searchpath)
+        self.max_size = max_size
+        self.gzip_level = gzip_level
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _mtime(self, name):
+        for directory in self.directories:
+            try:
+                return os.stat(os.path.join(directory, name)).st_mtime_ns
+            except OSError:
+                continue
+        return None
+
+    def get(self, name, **context):
+        """The CachedPage of template name rendered with context"""
+        key = (name, self._mtime(name), json.dumps(context, sort_keys=True, default=str))
+        with self._lock:
+            page = self._pages.get(key)
+            if page is not None:
+                self._pages.move_to_end(key)
+                self.hits += 1
+                return page
+            self.misses += 1
+
+        # Render outside the lock; two threads may both render a new page once
+        page = CachedPage(self.env.get_template(name).render(**context), self.gzip_level)
+        with self._lock:
+            self._pages[key] = page
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_size:
+                self._pages.popitem(last=False)
+        return page
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._pages),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,71 @@
+"""
+ملفات ثابتة مضغوطة مسبقاً - Static files with precompressed variants
+
+PrecompressedStaticFiles serves file.br or file.gz instead of file when the
+client accepts that encoding (q > 0, see assets.encoding) and the build
+wrote the copy, so nothing is compressed per request. Files whose name
+carries a content hash (written by assets.build) are cached by browsers for
+a year without revalidation; everything else must be revalidated (ETag /
+Last-Modified from StaticFiles).
+"""
+import mimetypes
+import re
+import stat
+
+import anyio
+
+from fastapi.staticfiles import StaticFiles
+
+from assets.encoding import encoding_quality, parse_accept_encoding
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+# name.<8 hex digits>.ext, as written by assets.build
+_HASHED_NAME = re.compile(r"\.[0-9a-f]{8}\.[a-z0-9]+$")
+
+# Preferred first
+_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def _media_type(path):
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    return media_type + "; charset=utf-8" if media_type.startswith("text/") else media_type
+
+
+def _accept_encoding(scope):
+    for key, value in scope["headers"]:
+        if key == b"accept-encoding":
+            return value.decode("latin-1")
+    return ""
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that prefers build-time .br/.gz copies and sets Cache-Control"""
+
+    async def get_response(self, path, scope):
+        response = None
+        accepted = parse_accept_encoding(_accept_encoding(scope)) if scope["method"] in ("GET", "HEAD") else {}
+        # Highest q first; sorted() keeps the server's preference on ties
+        candidates = sorted(_ENCODINGS, key=lambda item: -encoding_quality(accepted, item[0]))
+        for encoding, suffix in candidates:
+            if encoding_quality(accepted, encoding) <= 0:
+                continue
+            try:
+                full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+            except (OSError, ValueError):
+                # Bad path: let StaticFiles answer it below
+                break
+            if stat_result is None or not stat.S_ISREG(stat_result.st_mode):
+                continue
+            response = self.file_response(full_path, stat_result, scope)
+            # Content type of the original file, not of the .br/.gz
+            response.headers["content-type"] = _media_type(path)
+            response.headers["content-encoding"] = encoding
+            break
+        if response is None:
+            response = await super().get_response(path, scope)
+        if response.status_code in (200, 304):
+            response.headers["cache-control"] = IMMUTABLE if _HASHED_NAME.search(path) else REVALIDATE
+            response.headers["vary"] = "Accept-Encoding"
+        return response
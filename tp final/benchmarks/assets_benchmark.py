@@ -0,0 +1,127 @@
+"""
+Benchmark: bytes on the wire and estimated time to first paint of the pages,
+and gzip on the JSON list endpoint
+قياس حجم الصفحات المنقولة وزمن العرض الأول قبل وبعد بناء الملفات الثابتة
+
+Pages (built into a temporary directory, the repository is not touched):
+  inline     - the template as served today: CSS/JS inline, uncompressed
+  first      - built page gzipped + its precompressed CSS/JS (br when available)
+  repeat     - built page gzipped only: the hashed CSS/JS are cached as immutable
+
+First paint is estimated from a simple network model, not measured in a
+browser: one round trip plus transfer time for the document, plus one more
+round trip and transfer for the render-blocking stylesheet when it is a
+separate file. Use --rtt-ms and --mbps to model other links; use a browser
+profiler (Lighthouse) for real paint timings.
+
+JSON: GET /api/patients through the real app, with and without
+Accept-Encoding: gzip.
+
+Usage:
+    python benchmarks/assets_benchmark.py --rtt-ms 150 --mbps 1.6 --patients 20000
+"""
+import argparse
+import gzip
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def transfer_ms(size, mbps):
+    return size * 8 / (mbps * 1e6) * 1000
+
+
+def page_report(args):
+    from assets import build
+
+    tmp_base = tempfile.mkdtemp(prefix="tp-assets-")
+    try:
+        shutil.copytree(os.path.join(BASE_DIR, "templates"), os.path.join(tmp_base, "templates"),
+                        ignore=shutil.ignore_patterns("dist", "*.backup"))
+        os.makedirs(os.path.join(tmp_base, "static"))
+        manifest = build.build(tmp_base)
+        dist_dir = os.path.join(tmp_base, "static", build.DIST)
+        encoding = "br" if build.brotli is not None else "gz"
+
+        print(f"network model: {args.rtt_ms:.0f} ms RTT, {args.mbps} Mbit/s; assets as .{encoding}")
+        print(f"{'page':<18} {'inline B':>9} {'first B':>9} {'repeat B':>9} "
+              f"{'inline ms':>10} {'first ms':>9} {'repeat ms':>10}")
+        for template, entry in manifest.items():
+            with open(os.path.join(tmp_base, "templates", template), "rb") as f:
+                inline_size = len(f.read())
+            with open(os.path.join(tmp_base, "templates", build.DIST, template), "rb") as f:
+                page_gz = len(gzip.compress(f.read(), compresslevel=6))
+
+            css_size = 0
+            assets_size = 0
+            for asset in entry["assets"]:
+                path = os.path.join(dist_dir, asset + "." + encoding)
+                size = os.path.getsize(path)
+                assets_size += size
+                if asset.endswith(".css"):
+                    css_size += size
+
+            inline_ms = args.rtt_ms + transfer_ms(inline_size, args.mbps)
+            repeat_ms = args.rtt_ms + transfer_ms(page_gz, args.mbps)
+            first_ms = repeat_ms + (args.rtt_ms + transfer_ms(css_size, args.mbps) if css_size else 0)
+            print(f"{template:<18} {inline_size:9d} {page_gz + assets_size:9d} {page_gz:9d} "
+                  f"{inline_ms:10.0f} {first_ms:9.0f} {repeat_ms:10.0f}")
+    finally:
+        shutil.rmtree(tmp_base, ignore_errors=True)
+
+
+def json_report(args):
+    # Work on a throw-away database, never on database.db
+    tmp_dir = tempfile.mkdtemp(prefix="tp-bench-")
+    os.environ["DB_PATH"] = os.path.join(tmp_dir, "database.db")
+    os.environ.setdefault("SESSION_SECRET", "benchmark")
+    import main
+    from fastapi.testclient import TestClient
+
+    with main.get_db_connection() as conn:
+        conn.executemany(
+            "INSERT INTO patients (first_name, last_name, dob, sex, last_visit, visit_place, notes) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(f"First{i}", f"Last{i}", "1990-01-01", "Male" if i % 2 else "Female", "2025-01-01", "Clinic",
+              "Allergic to penicillin") for i in range(args.patients)]
+        )
+        # sessions are checked against a real user row
+        user_id = conn.execute(
+            "INSERT INTO users (username, password, role) VALUES ('benchmark', '', 'Doctor')"
+        ).lastrowid
+        conn.commit()
+
+    client = TestClient(main.app)
+    headers = {"Authorization": "Bearer " + main.session_manager.issue("benchmark", "Doctor", user_id)}
+    print(f"\nGET /api/patients, {args.patients} patients (gzip level {main.GZIP_LEVEL})")
+    print(f"{'encoding':<10} {'wire B':>10} {'best ms':>8}")
+    for accept in ("identity", "gzip"):
+        best, size = None, 0
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            response = client.get("/api/patients", headers={**headers, "Accept-Encoding": accept})
+            elapsed = (time.perf_counter() - start) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+            size = int(response.headers.get("content-length") or len(response.content))
+        print(f"{accept:<10} {size:10d} {best:8.1f}")
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rtt-ms", type=float, default=100.0)
+    parser.add_argument("--mbps", type=float, default=5.0, help="link bandwidth in Mbit/s")
+    parser.add_argument("--patients", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    os.chdir(BASE_DIR)
+    sys.path.insert(0, BASE_DIR)
+    page_report(args)
+    json_report(args)
+
+
+if __name__ == "__main__":
+    main_benchmark()
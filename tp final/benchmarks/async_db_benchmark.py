@@ -0,0 +1,141 @@
+"""
+Benchmark: blocking vs offloaded data-tier calls in async endpoints
+قياس زمن الاستجابة عند استدعاء قاعدة البيانات مباشرة أو عبر المنفذ غير المتزامن
+
+Runs the same mixed read/write workload against two small apps built on the
+main.py data tier: one calls the blocking functions directly inside
+`async def` handlers (the old behaviour), the other awaits the *_async
+versions. Prints p50/p95/p99 latency for reads and writes.
+
+Usage:
+    python benchmarks/async_db_benchmark.py
+
+The defaults are the scenario reported for the executor change: 600 req/s
+with 20% writes, where blocking calls queue up behind each other. At a
+much lower rate both modes keep up and show the same latency. The gap also
+grows with the cost of a commit (fsync): on a fast disk raise --write-ratio
+to see it.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+import httpx
+from fastapi import FastAPI
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def build_app(main, offload):
+    app = FastAPI()
+
+    if offload:
+        @app.get("/read/{patient_id}")
+        async def read(patient_id: int):
+            return await main.get_patient_by_id_async(patient_id)
+
+        @app.put("/write/{patient_id}")
+        async def write(patient_id: int):
+            await main.update_patient_with_notification_async(patient_id, "Bench", "Write", "1990-01-01", "Male", "updated")
+            return {"success": True}
+    else:
+        @app.get("/read/{patient_id}")
+        async def read(patient_id: int):
+            return main.get_patient_by_id(patient_id)
+
+        @app.put("/write/{patient_id}")
+        async def write(patient_id: int):
+            main.update_patient_with_notification(patient_id, "Bench", "Write", "1990-01-01", "Male", "updated")
+            return {"success": True}
+
+    return app
+
+
+async def run_load(app, rate, duration, patient_count, write_ratio):
+    """
+    Open-loop load: requests are started on a fixed schedule whether or not
+    earlier ones have finished, and latency is measured from the scheduled
+    start. A blocked event loop therefore shows up as queueing delay.
+    """
+    latencies = {"read": [], "write": []}
+    transport = httpx.ASGITransport(app=app)
+    interval = 1.0 / rate
+    total = int(rate * duration)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one_request(scheduled):
+            patient_id = random.randint(1, patient_count)
+            kind = "write" if random.random() < write_ratio else "read"
+            if kind == "write":
+                await client.put(f"/write/{patient_id}")
+            else:
+                await client.get(f"/read/{patient_id}")
+            latencies[kind].append((time.perf_counter() - scheduled) * 1000)
+
+        start = time.perf_counter()
+        tasks = []
+        for i in range(total):
+            scheduled = start + i * interval
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(one_request(scheduled)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+
+    return latencies, total / elapsed
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=int, default=600, help="requests started per second")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds of load per mode")
+    parser.add_argument("--patients", type=int, default=5000)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    args = parser.parse_args()
+
+    # Work on a throw-away copy of the schema, never on database.db
+    tmp_dir = tempfile.mkdtemp(prefix="tp-bench-")
+    os.environ["DB_PATH"] = os.path.join(tmp_dir, "database.db")
+    # Real fsync on commit, as a production deployment would have
+    os.environ.setdefault("DB_SYNCHRONOUS", "FULL")
+    # Every read goes to the database: served from the patient cache it would
+    # never reach the executor, and both modes would measure the same thing
+    os.environ.setdefault("PATIENT_CACHE_SIZE", "0")
+    os.chdir(BASE_DIR)
+    sys.path.insert(0, BASE_DIR)
+    import main
+
+    with main.get_db_connection() as conn:
+        conn.executemany(
+            "INSERT INTO patients (first_name, last_name, dob, sex, last_visit, visit_place, notes) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(f"First{i}", f"Last{i}", "1990-01-01", "Male" if i % 2 else "Female", "2025-01-01", "Clinic", "")
+             for i in range(args.patients)]
+        )
+        conn.commit()
+
+    print(f"{args.rate} req/s for {args.duration}s per mode, {int(args.write_ratio * 100)}% writes")
+    print(f"{'mode':<10} {'kind':<6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9}")
+    for mode, offload in (("blocking", False), ("offloaded", True)):
+        app = build_app(main, offload)
+        latencies, throughput = asyncio.run(run_load(app, args.rate, args.duration, args.patients, args.write_ratio))
+        for kind in ("read", "write"):
+            values = latencies[kind]
+            print(f"{mode:<10} {kind:<6} {percentile(values, 50):9.2f} {percentile(values, 95):9.2f} "
+                  f"{percentile(values, 99):9.2f} {throughput:9.0f}")
+
+
+if __name__ == "__main__":
+    main_benchmark()
@@ -0,0 +1,103 @@
+"""
+Benchmark: list endpoint serialization (query + encode) for large tables
+قياس زمن ترميز قوائم المرضى والتقارير والوصفات بصيغة JSON
+
+For each table size, builds the body of the patients, reports and
+prescriptions list responses three ways:
+  stdlib   - rows -> dict(sqlite3.Row) -> starlette JSONResponse (stdlib json), the old path
+  fast     - the same dicts encoded by FastJSONResponse (orjson/msgspec when installed)
+  rawjson  - rows encoded by SQLite json_object() and embedded as RawJSON, no dicts
+Timings include the query, as the endpoints do.
+
+Usage:
+    python benchmarks/json_benchmark.py --sizes 10000 100000 500000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from fastapi.responses import JSONResponse as StdlibJSONResponse
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def best_of(fn, repeat):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000, result
+
+
+def fill(main, size):
+    """Grow every table to size rows"""
+    with main.get_db_connection() as conn:
+        have = conn.execute("SELECT COUNT(*) FROM patients").fetchone()[0]
+        conn.executemany(
+            "INSERT INTO patients (first_name, last_name, dob, sex, last_visit, visit_place, notes) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(f"First{i}", f"Last{i}", "1990-01-01", "Male" if i % 2 else "Female", "2025-01-01", "Clinic",
+              "Allergic to penicillin") for i in range(have, size)]
+        )
+        conn.executemany(
+            "INSERT INTO reports (patient_id, report_type, diagnosis, treatment, medications, notes, created_by) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(i % size + 1, "Checkup", "Stable", "Rest", "None", "Follow up in 2 weeks", "doctor")
+             for i in range(have, size)]
+        )
+        conn.executemany(
+            "INSERT INTO prescriptions (patient_id, medication_name, dosage, frequency, duration, instructions, prescribed_by) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(i % size + 1, "Amoxicillin", "500mg", "3x daily", "7 days", "After meals", "doctor")
+             for i in range(have, size)]
+        )
+        conn.commit()
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000],
+                        help="table sizes to test (500000 needs several GB of RAM for the dict paths)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    # Work on a throw-away copy of the schema, never on database.db
+    tmp_dir = tempfile.mkdtemp(prefix="tp-bench-")
+    os.environ["DB_PATH"] = os.path.join(tmp_dir, "database.db")
+    os.chdir(BASE_DIR)
+    sys.path.insert(0, BASE_DIR)
+    import main
+    from serialization.responses import JSON_BACKEND
+
+    tables = {
+        "patients": "SELECT * FROM patients ORDER BY id DESC",
+        "reports": main.REPORTS_LIST_QUERY,
+        "prescriptions": main.PRESCRIPTIONS_LIST_QUERY,
+    }
+
+    def dict_rows(query):
+        # The list endpoints before pre-encoding: one dict per row
+        with main.get_db_connection() as conn:
+            return [dict(row) for row in conn.execute(query).fetchall()]
+
+    def raw_rows(query):
+        with main.get_db_connection() as conn:
+            return main.fetch_json_rows(conn, query)
+
+    print(f"encoder backend: {JSON_BACKEND}")
+    print(f"{'table':<14} {'rows':>8} {'stdlib ms':>10} {'fast ms':>10} {'rawjson ms':>11} {'body MB':>8}")
+    for size in sorted(args.sizes):
+        fill(main, size)
+        for table, query in tables.items():
+            stdlib_ms, _ = best_of(
+                lambda: StdlibJSONResponse({"success": True, "data": dict_rows(query)}).body, args.repeat)
+            fast_ms, _ = best_of(
+                lambda: main.JSONResponse({"success": True, "data": dict_rows(query)}).body, args.repeat)
+            raw_ms, body = best_of(
+                lambda: main.JSONResponse({"success": True, "data": raw_rows(query)}).body, args.repeat)
+            print(f"{table:<14} {size:>8} {stdlib_ms:10.1f} {fast_ms:10.1f} {raw_ms:11.1f} {len(body) / 1e6:8.1f}")
+
+
+if __name__ == "__main__":
+    main_benchmark()
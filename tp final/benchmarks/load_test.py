@@ -0,0 +1,305 @@
+"""
+Load test: role-mixed workload against the real main.app
+اختبار الحمل: مزيج من طلبات الأطباء والممرضين والصيادلة والمدير
+
+Seeds a temporary database with synthetic patients, reports, prescriptions
+and notifications, logs in one user per role through /login, then runs
+--concurrency clients for --duration seconds through an in-process ASGI
+client. Every client repeatedly picks a role (by --mix weight) and one of
+that role's operations:
+
+    doctor      add / update patients, write reports and prescriptions, open a timeline
+    nurse       patient list pages, patient details, search, a patient's reports
+    pharmacist  today's prescriptions, a patient's prescriptions
+    admin       list users, add a user, change its role, delete it
+
+Results (requests/s and p50/p95/p99/max latency per endpoint) are written as
+JSON. With --baseline, the p99 of each endpoint is compared with an earlier
+result file.
+
+Usage:
+    python benchmarks/load_test.py --patients 20000 --duration 20 --concurrency 32 --output run.json
+    python benchmarks/load_test.py --baseline run.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import httpx
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ROLE_USERS = {
+    "doctor": ("doctor", "Doctor"),
+    "nurse": ("nurse", "Nurse"),
+    "pharmacist": ("pharma", "Pharmacist"),
+    "admin": ("admin", "Admin"),
+}
+PASSWORD = "load-test"
+FIRST_NAMES = ["Amine", "Sara", "Yacine", "Lina", "Omar", "Nour", "Karim", "Meriem", "John", "Jane"]
+LAST_NAMES = ["Benali", "Haddad", "Mansouri", "Brahimi", "Smith", "Doe", "Saidi", "Khelifi"]
+MEDICATIONS = ["Amoxicillin", "Paracetamol", "Ibuprofen", "Metformin", "Omeprazole"]
+REPORT_TYPES = ["Checkup", "Blood Test", "X-Ray", "Follow-up"]
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def seed(main, args, rng):
+    """Fill the temporary database with synthetic data"""
+    from security.passwords import hash_password
+
+    password_hash = hash_password(PASSWORD)
+    now = datetime.now()
+
+    def timestamp(days_back):
+        return (now - timedelta(days=days_back, seconds=rng.randint(0, 86399))).strftime("%Y-%m-%d %H:%M:%S")
+
+    with main.get_db_connection() as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO users (username, password, role) VALUES (?, ?, ?)",
+            [(username, password_hash, role) for username, role in ROLE_USERS.values()]
+        )
+        conn.executemany(
+            "INSERT INTO patients (first_name, last_name, dob, sex, last_visit, visit_place, notes) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), f"19{rng.randint(40, 99)}-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}",
+              rng.choice(["Male", "Female"]), timestamp(rng.randint(0, 365))[:10], "Clinic", "Synthetic patient")
+             for _ in range(args.patients)]
+        )
+        conn.executemany(
+            "INSERT INTO reports (patient_id, report_type, diagnosis, treatment, medications, notes, created_by, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(rng.randint(1, args.patients), rng.choice(REPORT_TYPES), "Stable", "Rest", rng.choice(MEDICATIONS),
+              "", "doctor", timestamp(rng.randint(0, 730)))
+             for _ in range(args.reports)]
+        )
+        conn.executemany(
+            "INSERT INTO prescriptions (patient_id, medication_name, dosage, frequency, duration, instructions, prescribed_by, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(rng.randint(1, args.patients), rng.choice(MEDICATIONS), "500mg", "2x daily", "7 days", "",
+              "doctor", timestamp(rng.randint(0, 730)))
+             for _ in range(args.prescriptions)]
+        )
+        conn.executemany(
+            "INSERT INTO notifications (title, message, is_read) VALUES (?, ?, ?)",
+            [("Seed", f"Synthetic notification {i}", int(rng.random() < 0.9)) for i in range(args.notifications)]
+        )
+        conn.commit()
+
+
+def build_operations(patient_count, rng):
+    """role -> list of (weight, label, coroutine function taking (client, headers))"""
+    today = datetime.now().strftime("%Y-%m-%d")
+
+    def patient_id():
+        return rng.randint(1, patient_count)
+
+    def patient_form():
+        return {"first_name": rng.choice(FIRST_NAMES), "last_name": rng.choice(LAST_NAMES),
+                "dob": "1990-01-01", "sex": rng.choice(["Male", "Female"]), "notes": "load test"}
+
+    async def admin_user_cycle(client, headers):
+        # Add a user, change its role, delete it: three requests, timed separately
+        name = f"load{rng.randrange(10 ** 9)}"
+        timings = []
+        start = time.perf_counter()
+        response = await client.post("/api/admin/users", headers=headers,
+                                     data={"username": name, "password": "pw", "role": "Nurse"})
+        timings.append(("POST /api/admin/users", response, start))
+        user_id = response.json().get("user_id")
+        if user_id:
+            start = time.perf_counter()
+            response = await client.put(f"/api/admin/users/{user_id}?role=Pharmacist", headers=headers)
+            timings.append(("PUT /api/admin/users/{id}", response, start))
+            start = time.perf_counter()
+            response = await client.delete(f"/api/admin/users/{user_id}", headers=headers)
+            timings.append(("DELETE /api/admin/users/{id}", response, start))
+        return timings
+
+    return {
+        "doctor": [
+            (3, "POST /api/patients", lambda c, h: c.post("/api/patients", headers=h, data=patient_form())),
+            (2, "PUT /api/patients/{id}", lambda c, h: c.put(f"/api/patients/{patient_id()}", headers=h, data=patient_form())),
+            (2, "POST /api/reports", lambda c, h: c.post("/api/reports", headers=h, data={
+                "patient_id": patient_id(), "report_type": rng.choice(REPORT_TYPES), "diagnosis": "Stable",
+                "treatment": "Rest", "medications": "", "notes": "", "created_by": "doctor"})),
+            (2, "POST /api/prescriptions", lambda c, h: c.post("/api/prescriptions", headers=h, data={
+                "patient_id": patient_id(), "medication_name": rng.choice(MEDICATIONS), "dosage": "500mg",
+                "frequency": "2x daily", "duration": "7 days", "instructions": "", "prescribed_by": "doctor"})),
+            (3, "GET /api/patients/{id}/timeline", lambda c, h: c.get(f"/api/patients/{patient_id()}/timeline", headers=h)),
+        ],
+        "nurse": [
+            (4, "GET /api/patients?limit=50", lambda c, h: c.get("/api/patients?limit=50", headers=h)),
+            (4, "GET /api/patients/{id}", lambda c, h: c.get(f"/api/patients/{patient_id()}", headers=h)),
+            (2, "GET /api/patients/search", lambda c, h: c.get(f"/api/patients/search?q={rng.choice(LAST_NAMES)[:3]}", headers=h)),
+            (2, "GET /api/reports?patient_id", lambda c, h: c.get(f"/api/reports?patient_id={patient_id()}", headers=h)),
+            (1, "GET /api/stats", lambda c, h: c.get("/api/stats", headers=h)),
+            (1, "GET /api/notifications", lambda c, h: c.get("/api/notifications", headers=h)),
+        ],
+        "pharmacist": [
+            (3, "GET /api/prescriptions?date=today", lambda c, h: c.get(
+                f"/api/prescriptions?date_from={today}&date_to={today}&limit=100", headers=h)),
+            (3, "GET /api/prescriptions?patient_id", lambda c, h: c.get(f"/api/prescriptions?patient_id={patient_id()}", headers=h)),
+            (1, "GET /api/prescriptions?medication_name", lambda c, h: c.get(
+                f"/api/prescriptions?medication_name={rng.choice(MEDICATIONS)}&limit=50", headers=h)),
+        ],
+        "admin": [
+            (3, "GET /api/admin/users", lambda c, h: c.get("/api/admin/users", headers=h)),
+            (1, None, admin_user_cycle),
+        ],
+    }
+
+
+async def run_load(app, tokens, operations, mix, concurrency, duration, rng):
+    samples = {}
+    errors = {}
+
+    def record(label, response, start):
+        samples.setdefault(label, []).append((time.perf_counter() - start) * 1000)
+        if response.status_code >= 400:
+            errors[label] = errors.get(label, 0) + 1
+
+    roles = list(mix)
+    role_weights = [mix[role] for role in roles]
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://load") as client:
+        deadline = time.perf_counter() + duration
+
+        async def worker():
+            while time.perf_counter() < deadline:
+                role = rng.choices(roles, role_weights)[0]
+                weight_list = [weight for weight, _, _ in operations[role]]
+                _, label, operation = rng.choices(operations[role], weight_list)[0]
+                headers = {"Authorization": f"Bearer {tokens[role]}"}
+                start = time.perf_counter()
+                result = await operation(client, headers)
+                if label is None:
+                    for sub_label, response, sub_start in result:
+                        record(sub_label, response, sub_start)
+                else:
+                    record(label, result, start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return samples, errors, elapsed
+
+
+async def login_all(app):
+    tokens = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://load") as client:
+        for role, (username, _) in ROLE_USERS.items():
+            response = await client.post("/login", data={"username": username, "password": PASSWORD})
+            response.raise_for_status()
+            tokens[role] = response.json()["token"]
+    return tokens
+
+
+def summarize(samples, errors, elapsed, config):
+    endpoints = {}
+    for label in sorted(samples):
+        values = samples[label]
+        endpoints[label] = {
+            "count": len(values),
+            "rps": round(len(values) / elapsed, 1),
+            "errors": errors.get(label, 0),
+            "p50_ms": round(percentile(values, 50), 2),
+            "p95_ms": round(percentile(values, 95), 2),
+            "p99_ms": round(percentile(values, 99), 2),
+            "max_ms": round(max(values), 2),
+        }
+    total = sum(len(values) for values in samples.values())
+    everything = [value for values in samples.values() for value in values]
+    return {
+        "config": config,
+        "total": {
+            "requests": total,
+            "rps": round(total / elapsed, 1),
+            "errors": sum(errors.values()),
+            "p50_ms": round(percentile(everything, 50), 2),
+            "p95_ms": round(percentile(everything, 95), 2),
+            "p99_ms": round(percentile(everything, 99), 2),
+        },
+        "endpoints": endpoints,
+    }
+
+
+def print_comparison(result, baseline):
+    print(f"{'endpoint':<42} {'p99 ms':>9} {'base p99':>9} {'change':>8}")
+    for label, stats in result["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(label)
+        if not before:
+            print(f"{label:<42} {stats['p99_ms']:9.2f} {'-':>9} {'new':>8}")
+            continue
+        change = (stats["p99_ms"] - before["p99_ms"]) / before["p99_ms"] * 100 if before["p99_ms"] else 0.0
+        print(f"{label:<42} {stats['p99_ms']:9.2f} {before['p99_ms']:9.2f} {change:+7.1f}%")
+    print(f"{'total rps':<42} {result['total']['rps']:9.1f} {baseline['total']['rps']:9.1f}")
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--patients", type=int, default=5000)
+    parser.add_argument("--reports", type=int, default=10000)
+    parser.add_argument("--prescriptions", type=int, default=10000)
+    parser.add_argument("--notifications", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=16, help="clients running at the same time")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load")
+    parser.add_argument("--mix", default="doctor=3,nurse=4,pharmacist=2,admin=1",
+                        help="relative weight of each role's requests")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON result to this file (default: stdout)")
+    parser.add_argument("--baseline", help="earlier JSON result to compare p99 latencies with")
+    args = parser.parse_args()
+
+    mix = {}
+    for part in args.mix.split(","):
+        role, _, weight = part.partition("=")
+        if role.strip() not in ROLE_USERS:
+            parser.error(f"unknown role in --mix: {role}")
+        mix[role.strip()] = float(weight)
+
+    # Work on a throw-away database, never on database.db
+    tmp_dir = tempfile.mkdtemp(prefix="tp-load-")
+    os.environ["DB_PATH"] = os.path.join(tmp_dir, "database.db")
+    os.environ.setdefault("SESSION_SECRET", "load-test")
+    os.chdir(BASE_DIR)
+    sys.path.insert(0, BASE_DIR)
+    import main
+
+    rng = random.Random(args.seed)
+    seed(main, args, rng)
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "baseline")}
+
+    tokens = asyncio.run(login_all(main.app))
+    operations = build_operations(args.patients, rng)
+    samples, errors, elapsed = asyncio.run(
+        run_load(main.app, tokens, operations, mix, args.concurrency, args.duration, rng)
+    )
+    result = summarize(samples, errors, elapsed, config)
+
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"{result['total']['requests']} requests, {result['total']['rps']} req/s, "
+              f"{result['total']['errors']} errors -> {args.output}")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            print_comparison(result, json.load(f))
+
+
+if __name__ == "__main__":
+    main_benchmark()
@@ -0,0 +1,131 @@
+"""
+Benchmark: login throughput with the password KDF inline vs on the KDF pool
+قياس عدد عمليات تسجيل الدخول في الثانية أثناء ذروة تغيير المناوبة
+
+Simulates a shift-change login storm: --concurrency clients log in again
+and again for --duration seconds while a probe requests a trivial endpoint
+every 10 ms. "inline" verifies the scrypt hash directly inside the async
+handler (blocking the event loop); "pool-N" uses main.authenticate_user
+with a PasswordHasher of N workers. Prints logins/s and the probe latency,
+which shows how long other requests wait behind the KDF.
+
+Usage:
+    python benchmarks/login_benchmark.py --users 50 --concurrency 20 --workers 1 2 4
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+from fastapi import FastAPI, Form
+from fastapi.responses import JSONResponse
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def build_app(main, inline):
+    from security.passwords import verify_password
+
+    app = FastAPI()
+
+    @app.post("/login")
+    async def login(username: str = Form(...), password: str = Form(...)):
+        if inline:
+            user = main.get_user_credentials(username)
+            ok = user is not None and verify_password(password, user["password"])[0]
+        else:
+            ok = bool(await main.authenticate_user(username, password))
+        return JSONResponse({"success": ok}, status_code=200 if ok else 401)
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    return app
+
+
+async def run_storm(app, users, concurrency, duration):
+    transport = httpx.ASGITransport(app=app)
+    logins = 0
+    probe = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        deadline = time.perf_counter() + duration
+
+        async def client_loop(i):
+            nonlocal logins
+            while time.perf_counter() < deadline:
+                username = f"user{(i + logins) % users}"
+                response = await client.post("/login", data={"username": username, "password": "secret"})
+                assert response.status_code == 200, response.text
+                logins += 1
+
+        async def probe_loop():
+            # Latency is measured from the scheduled time, so a blocked loop
+            # shows up as delay even when the probe could not even be sent
+            scheduled = time.perf_counter()
+            while scheduled < deadline:
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                await client.get("/ping")
+                probe.append((time.perf_counter() - scheduled) * 1000)
+                scheduled = max(scheduled + 0.01, time.perf_counter())
+
+        start = time.perf_counter()
+        await asyncio.gather(probe_loop(), *(client_loop(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return logins / elapsed, probe
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=20, help="clients logging in at the same time")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds of load per mode")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="KDF pool sizes to try")
+    args = parser.parse_args()
+
+    # Work on a throw-away copy of the schema, never on database.db
+    tmp_dir = tempfile.mkdtemp(prefix="tp-bench-")
+    os.environ["DB_PATH"] = os.path.join(tmp_dir, "database.db")
+    # Measure the KDF, not the failed-login throttle
+    os.environ["LOGIN_MAX_FAILURES"] = "1000000"
+    os.chdir(BASE_DIR)
+    sys.path.insert(0, BASE_DIR)
+    import main
+    from security.passwords import PasswordHasher, hash_password
+
+    password_hash = hash_password("secret")
+    with main.get_db_connection() as conn:
+        conn.executemany(
+            "INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
+            [(f"user{i}", password_hash, "Nurse") for i in range(args.users)]
+        )
+        conn.commit()
+
+    print(f"{args.concurrency} concurrent clients, {args.duration}s per mode, cpus={os.cpu_count()}")
+    print(f"{'mode':<8} {'logins/s':>9} {'probe p50':>10} {'probe p99':>10} {'probe max':>10}")
+    modes = [("inline", True, None)] + [(f"pool-{w}", False, w) for w in args.workers]
+    for name, inline, workers in modes:
+        if workers:
+            main.password_hasher.shutdown()
+            main.password_hasher = PasswordHasher(workers=workers)
+        app = build_app(main, inline)
+        rate, probe = asyncio.run(run_storm(app, args.users, args.concurrency, args.duration))
+        print(f"{name:<8} {rate:9.1f} {percentile(probe, 50):10.2f} {percentile(probe, 99):10.2f} "
+              f"{max(probe, default=0.0):10.2f}")
+
+
+if __name__ == "__main__":
+    main_benchmark()
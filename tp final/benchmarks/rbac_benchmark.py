@@ -0,0 +1,99 @@
+"""
+Benchmark: nested-dict permission check vs compiled bitmask table
+قياس سرعة التحقق من الصلاحيات قبل وبعد تجميع الجدول
+
+Compares the original check_permission (three dict lookups and a linear
+`in` over the action list) with PermissionTable.allows, with
+PermissionTable.check (the path taken by the require() dependency, where
+the action bit is resolved once per route) and with PolicyStore.allows
+(which also checks whether the policy file changed).
+
+Usage:
+    python benchmarks/rbac_benchmark.py --number 1000000
+"""
+import argparse
+import os
+import sys
+import timeit
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from security.rbac import ACTION_BITS, PermissionTable, PolicyStore  # noqa: E402
+
+ROLE_PERMISSIONS = {
+    "Doctor": {
+        "patients": ["read", "write", "update", "delete"],
+        "reports": ["read", "write"],
+        "prescriptions": ["read", "write"]
+    },
+    "Nurse": {
+        "patients": ["read"],
+        "reports": ["read"],
+        "prescriptions": []
+    },
+    "Pharmacist": {
+        "patients": ["read"],
+        "reports": [],
+        "prescriptions": ["read"]
+    },
+    "Admin": {
+        "patients": ["read", "write", "update", "delete"],
+        "reports": ["read", "write"],
+        "prescriptions": ["read", "write"],
+        "users": ["read", "write", "update", "delete"]
+    }
+}
+
+# A mix of allowed, denied and unknown checks
+CHECKS = [
+    ("Doctor", "patients", "delete"),
+    ("Nurse", "patients", "read"),
+    ("Nurse", "prescriptions", "write"),
+    ("Pharmacist", "reports", "read"),
+    ("Admin", "users", "update"),
+    ("Guest", "patients", "read"),
+]
+
+
+def legacy_check_permission(role, resource, action):
+    if role not in ROLE_PERMISSIONS:
+        return False
+
+    if resource not in ROLE_PERMISSIONS[role]:
+        return False
+
+    return action in ROLE_PERMISSIONS[role][resource]
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=1_000_000, help="permission checks per implementation")
+    args = parser.parse_args()
+
+    table = PermissionTable(ROLE_PERMISSIONS)
+    store = PolicyStore(ROLE_PERMISSIONS, os.path.join(BASE_DIR, "no-such-policy.json"))
+
+    for check in CHECKS:
+        expected = legacy_check_permission(*check)
+        assert table.allows(*check) == expected and store.allows(*check) == expected, check
+        assert table.check(check[0], check[1], ACTION_BITS[check[2]]) == expected, check
+
+    rounds = max(1, args.number // len(CHECKS))
+    print(f"{rounds * len(CHECKS)} checks per implementation")
+    print(f"{'implementation':<22} {'total s':>9} {'ns/check':>9}")
+    bit_checks = [(role, resource, ACTION_BITS[action]) for role, resource, action in CHECKS]
+    for name, fn, checks in (("nested dict (legacy)", legacy_check_permission, CHECKS),
+                             ("PermissionTable", table.allows, CHECKS),
+                             ("PermissionTable.check", table.check, bit_checks),
+                             ("PolicyStore", store.allows, CHECKS)):
+        def run(fn=fn, checks=checks):
+            for check in checks:
+                fn(*check)
+
+        elapsed = min(timeit.repeat(run, number=rounds, repeat=3))
+        print(f"{name:<22} {elapsed:9.3f} {elapsed / (rounds * len(CHECKS)) * 1e9:9.1f}")
+
+
+if __name__ == "__main__":
+    main_benchmark()
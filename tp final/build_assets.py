@@ -0,0 +1,45 @@
+"""
+بناء ملفات الواجهة - Build the static assets of the templates
+
+Moves the inline CSS/JavaScript of templates/*.html into minified,
+content-hashed files under static/dist/ (with .gz and, when the brotli
+package is installed, .br copies) and writes the matching templates to
+templates/dist/. Run it after editing a template; until then the server
+keeps serving the unbuilt templates.
+
+Usage:
+    python build_assets.py
+    python build_assets.py home.html admin_users.html
+"""
+import argparse
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("templates", nargs="*", help="template names (default: every template)")
+    args = parser.parse_args()
+
+    sys.path.insert(0, BASE_DIR)
+    from assets import build
+
+    manifest = build.build(BASE_DIR, args.templates or None)
+    dist_dir = os.path.join(BASE_DIR, "static", build.DIST)
+    for template, entry in manifest.items():
+        print(template)
+        for asset in entry["assets"]:
+            path = os.path.join(dist_dir, asset)
+            sizes = [f"{os.path.getsize(path)} B"]
+            for suffix in (".gz", ".br"):
+                if os.path.exists(path + suffix):
+                    sizes.append(f"{suffix[1:]} {os.path.getsize(path + suffix)} B")
+            print(f"  {asset}: {', '.join(sizes)}")
+    if build.brotli is None:
+        print("brotli is not installed: only .gz copies were written")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,50 @@
+"""
+طبقة بيانات غير متزامنة - Async access to the data tier
+
+sqlite3 calls block. Calling them straight from an `async def` endpoint
+freezes the event loop (and every other request on the worker) until the
+query and commit finish. DatabaseExecutor runs the regular data-tier
+functions on background threads instead: reads and writes on separate
+pools, so a burst of writes waiting on the write queue never starves reads.
+"""
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+
+class DatabaseExecutor:
+    """Thread pools that turn blocking data-tier functions into awaitables"""
+
+    def __init__(self, readers=4, writers=1):
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="db-read")
+        self._writers = ThreadPoolExecutor(max_workers=writers, thread_name_prefix="db-write")
+
+    async def _run(self, pool, fn, args, kwargs):
+        loop = asyncio.get_running_loop()
+        # Carry context variables (request-scoped state) over to the worker thread
+        context = contextvars.copy_context()
+        call = functools.partial(context.run, fn, *args, **kwargs)
+        return await loop.run_in_executor(pool, call)
+
+    async def read(self, fn, *args, **kwargs):
+        """Run a read-only data-tier function on the reader pool"""
+        return await self._run(self._readers, fn, args, kwargs)
+
+    async def write(self, fn, *args, **kwargs):
+        """Run a data-tier function that writes on the writer pool"""
+        return await self._run(self._writers, fn, args, kwargs)
+
+    def wrap(self, fn, write=False):
+        """Build an awaitable version of a data-tier function"""
+        run = self.write if write else self.read
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            return await run(fn, *args, **kwargs)
+
+        return wrapper
+
+    def shutdown(self):
+        self._readers.shutdown(wait=True)
+        self._writers.shutdown(wait=True)
@@ -0,0 +1,116 @@
+"""
+ذاكرة تخزين مؤقت للسجلات - In-process read-through cache
+
+RecordCache is a small LRU cache with a time-to-live. The data tier
+invalidates entries itself whenever it writes. In addition, when a
+TableVersionWatcher is attached, the whole cache is cleared once another
+connection (another worker process, a script) has written to the cached
+table, so a worker never serves a record that changed behind its back for
+longer than the watcher's interval. Writes to other tables, and this
+worker's own writes, do not clear it.
+
+Cached values are shared between callers and must be treated as read-only.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class TableVersionWatcher:
+    """
+    Detects writes to one table through its table_versions row, which
+    triggers bump on every insert, update and delete from any connection.
+    The data tier reports its own writes with advance() so they are not
+    mistaken for someone else's.
+    """
+
+    def __init__(self, read_version, interval=0.5):
+        """
+        read_version: read_version() -> the table's current version
+        interval: seconds between two reads (0: read on every lookup)
+        """
+        self._read = read_version
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._version = None
+        self._next_read = 0.0
+
+    def changed(self):
+        """True if someone else wrote to the table since the previous read"""
+        now = time.monotonic()
+        if now < self._next_read:
+            return False
+        self._next_read = now + self.interval
+        version = self._read()
+        with self._lock:
+            # versions only go up: an older value comes from a read that raced with advance()
+            if self._version is not None and version <= self._version:
+                return False
+            self._version = version
+            return True
+
+    def advance(self, before, after):
+        """Record a write of this worker that took the version from before to after"""
+        with self._lock:
+            if self._version == before:
+                self._version = after
+
+
+class RecordCache:
+    """Thread-safe LRU + TTL cache with hit/miss counters"""
+
+    def __init__(self, max_size=1024, ttl=60.0, watcher=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.watcher = watcher
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped on every invalidation so a load that raced with a write is not stored
+        self._generation = 0
+
+    def get_or_load(self, key, loader):
+        """Return the cached value for key, calling loader() on a miss"""
+        if self.watcher is not None and self.watcher.changed():
+            self.invalidate()
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            generation = self._generation
+
+        value = loader()
+
+        with self._lock:
+            if generation == self._generation and self.max_size > 0:
+                self._entries[key] = (value, time.monotonic() + self.ttl)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, *keys):
+        """Drop the given keys, or everything when called without keys"""
+        with self._lock:
+            self._generation += 1
+            if not keys:
+                self._entries.clear()
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
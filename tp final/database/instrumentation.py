@@ -0,0 +1,164 @@
+"""
+قياس استعلامات SQLite - SQLite statement instrumentation
+
+InstrumentedConnection is the connection class of the pool (sqlite3
+factory=). Every statement it runs is timed - execute() plus the fetch
+calls, which is where SQLite does the actual stepping - and its time,
+statement count and fetched rows are added to the RequestMetrics of the
+request being served (monitoring.metrics).
+
+Statements slower than the SlowQueryLog threshold are logged with their
+EXPLAIN QUERY PLAN. Parameter values are never logged: they hold patient
+data.
+"""
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from monitoring.metrics import current_request
+
+logger = logging.getLogger("slow_query")
+
+# Statements EXPLAIN QUERY PLAN can describe
+_EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+def format_query_plan(plan_rows):
+    """EXPLAIN QUERY PLAN rows (id, parent, notused, detail) as indented lines"""
+    depth = {0: -1}
+    lines = []
+    for row in plan_rows:
+        node_id, parent, detail = row[0], row[1], row[3]
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node_id] + detail)
+    return lines
+
+
+class SlowQueryLog:
+    """Logs statements slower than threshold_ms and keeps the latest `keep` of them"""
+
+    def __init__(self, threshold_ms=100.0, keep=100, on_slow=None):
+        self.threshold = threshold_ms / 1000
+        self.on_slow = on_slow
+        self._recent = deque(maxlen=keep)
+        self._lock = threading.Lock()
+
+    def record(self, conn, sql, params, elapsed):
+        sql = " ".join(sql.split())
+        plan = None
+        if sql.upper().startswith(_EXPLAINABLE) and params is not None:
+            try:
+                # Plain cursor: the EXPLAIN itself is not instrumented
+                cursor = sqlite3.Cursor(conn)
+                cursor.row_factory = None
+                plan = format_query_plan(sqlite3.Cursor.execute(cursor, "EXPLAIN QUERY PLAN " + sql, params).fetchall())
+            except sqlite3.Error as e:
+                plan = [f"(EXPLAIN failed: {e})"]
+        entry = {
+            "sql": sql,
+            "duration_ms": round(elapsed * 1000, 2),
+            "plan": plan,
+            "logged_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        with self._lock:
+            self._recent.append(entry)
+        logger.warning("Slow query (%.1f ms): %s%s", elapsed * 1000, sql,
+                       "".join("\n    " + line for line in plan or ()))
+        if self.on_slow is not None:
+            self.on_slow()
+
+    def recent(self):
+        """Latest slow statements, newest first"""
+        with self._lock:
+            return list(reversed(self._recent))
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that reports each statement's time and rows"""
+
+    slow_log = None
+    _sql = None
+    _params = None
+    _elapsed = 0.0
+    _logged = True
+
+    def _track(self, elapsed, rows, new_statement=False):
+        metrics = current_request()
+        if metrics is not None:
+            metrics.db_time += elapsed
+            metrics.rows += rows
+            if new_statement:
+                metrics.queries += 1
+        self._elapsed += elapsed
+        slow_log = self.slow_log
+        if not self._logged and slow_log is not None and self._elapsed >= slow_log.threshold:
+            self._logged = True
+            slow_log.record(self.connection, self._sql, self._params, self._elapsed)
+
+    def _start(self, sql, params):
+        self._sql, self._params = sql, params
+        self._elapsed = 0.0
+        self._logged = False
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._start(sql, parameters)
+            self._track(time.perf_counter() - start, 0, new_statement=True)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            # No single parameter set to EXPLAIN with
+            self._start(sql, None)
+            self._track(time.perf_counter() - start, 0, new_statement=True)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._track(time.perf_counter() - start, 0 if row is None else 1)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._track(time.perf_counter() - start, len(rows))
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._track(time.perf_counter() - start, len(rows))
+        return rows
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """
+    Connection whose cursors are InstrumentedCursor.
+    Rows are counted by the fetch methods; iterate over fetchall() rather
+    than over the cursor itself.
+    """
+
+    cursor_class = InstrumentedCursor
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or self.cursor_class)
+
+    # sqlite3.Connection.execute does not go through cursor()
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def instrumented_connection(slow_log=None):
+    """Connection class (for sqlite3.connect(factory=...)) reporting slow statements to slow_log"""
+    cursor_class = type("InstrumentedCursor", (InstrumentedCursor,), {"slow_log": slow_log})
+    return type("InstrumentedConnection", (InstrumentedConnection,), {"cursor_class": cursor_class})
@@ -0,0 +1,366 @@
+"""
+ترحيل مخطط قاعدة البيانات - Versioned schema migrations
+
+Each migration has a version number, a short name and a list of SQL
+statements. Applied versions are recorded in the schema_migrations table,
+so running the migrations again (for example on every server start) only
+applies what is missing. Every migration runs in its own transaction.
+"""
+import sqlite3
+
+# Tables whose changes are counted in table_versions (migration 8)
+VERSIONED_TABLES = ("patients", "reports", "prescriptions", "notifications", "users")
+
+MIGRATIONS = [
+    (1, "initial schema", [
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            role TEXT NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS patients (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            first_name TEXT,
+            last_name TEXT,
+            dob TEXT,
+            sex TEXT,
+            last_visit TEXT,
+            visit_place TEXT,
+            notes TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS notifications (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            message TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            is_read INTEGER DEFAULT 0
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS reports (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patient_id INTEGER NOT NULL,
+            report_type TEXT NOT NULL,
+            diagnosis TEXT,
+            treatment TEXT,
+            medications TEXT,
+            notes TEXT,
+            created_by TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (patient_id) REFERENCES patients(id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS prescriptions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patient_id INTEGER NOT NULL,
+            medication_name TEXT NOT NULL,
+            dosage TEXT NOT NULL,
+            frequency TEXT NOT NULL,
+            duration TEXT NOT NULL,
+            instructions TEXT,
+            prescribed_by TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (patient_id) REFERENCES patients(id)
+        )
+        ''',
+    ]),
+
+    (2, "patient full-text search", [
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS patients_fts USING fts5(
+            first_name,
+            last_name,
+            notes,
+            content='patients',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS patients_fts_insert AFTER INSERT ON patients BEGIN
+            INSERT INTO patients_fts (rowid, first_name, last_name, notes)
+            VALUES (new.id, new.first_name, new.last_name, new.notes);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS patients_fts_delete AFTER DELETE ON patients BEGIN
+            INSERT INTO patients_fts (patients_fts, rowid, first_name, last_name, notes)
+            VALUES ('delete', old.id, old.first_name, old.last_name, old.notes);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS patients_fts_update AFTER UPDATE ON patients BEGIN
+            INSERT INTO patients_fts (patients_fts, rowid, first_name, last_name, notes)
+            VALUES ('delete', old.id, old.first_name, old.last_name, old.notes);
+            INSERT INTO patients_fts (rowid, first_name, last_name, notes)
+            VALUES (new.id, new.first_name, new.last_name, new.notes);
+        END
+        ''',
+        # index rows that existed before the search table was created
+        "INSERT INTO patients_fts (patients_fts) VALUES ('rebuild')",
+    ]),
+
+    (3, "indexes for hot queries", [
+        # report / prescription list queries: ORDER BY created_at, JOIN on patient_id
+        "CREATE INDEX IF NOT EXISTS idx_reports_created_at ON reports (created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_reports_patient ON reports (patient_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_prescriptions_created_at ON prescriptions (created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_prescriptions_patient ON prescriptions (patient_id, created_at)",
+        # get_all_notifications: ORDER BY created_at
+        "CREATE INDEX IF NOT EXISTS idx_notifications_created_at ON notifications (created_at)",
+        # get_unread_notifications_count: only unread rows are indexed
+        "CREATE INDEX IF NOT EXISTS idx_notifications_unread ON notifications (id) WHERE is_read = 0",
+        # patient statistics: counts by sex and by last_visit
+        "CREATE INDEX IF NOT EXISTS idx_patients_sex ON patients (sex)",
+        "CREATE INDEX IF NOT EXISTS idx_patients_last_visit ON patients (last_visit)",
+        "ANALYZE",
+    ]),
+
+    (4, "unread notification counter", [
+        # one row per counter; read in constant time instead of COUNT(*)
+        '''
+        CREATE TABLE IF NOT EXISTS notification_counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+        ''',
+        '''
+        INSERT OR REPLACE INTO notification_counters (name, value)
+        VALUES ('unread', (SELECT COUNT(*) FROM notifications WHERE is_read = 0))
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS notifications_unread_insert
+        AFTER INSERT ON notifications WHEN new.is_read = 0 BEGIN
+            UPDATE notification_counters SET value = value + 1 WHERE name = 'unread';
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS notifications_unread_update
+        AFTER UPDATE OF is_read ON notifications WHEN (old.is_read = 0) != (new.is_read = 0) BEGIN
+            UPDATE notification_counters
+            SET value = value + (CASE WHEN new.is_read = 0 THEN 1 ELSE -1 END)
+            WHERE name = 'unread';
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS notifications_unread_delete
+        AFTER DELETE ON notifications WHEN old.is_read = 0 BEGIN
+            UPDATE notification_counters SET value = value - 1 WHERE name = 'unread';
+        END
+        ''',
+    ]),
+
+    (5, "materialized dashboard statistics", [
+        # totals: patients (all / male / female), reports, prescriptions
+        '''
+        CREATE TABLE IF NOT EXISTS stats_counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+        ''',
+        # number of patients per last_visit day (visit histogram)
+        '''
+        CREATE TABLE IF NOT EXISTS stats_daily_visits (
+            day TEXT PRIMARY KEY,
+            visits INTEGER NOT NULL
+        )
+        ''',
+        # reports / prescriptions written per doctor
+        '''
+        CREATE TABLE IF NOT EXISTS stats_author_counts (
+            author TEXT PRIMARY KEY,
+            reports INTEGER NOT NULL DEFAULT 0,
+            prescriptions INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        '''
+        INSERT OR REPLACE INTO stats_counters (name, value)
+        SELECT 'patients_total', COUNT(*) FROM patients
+        UNION ALL SELECT 'patients_male', COUNT(*) FROM patients WHERE sex = 'Male'
+        UNION ALL SELECT 'patients_female', COUNT(*) FROM patients WHERE sex = 'Female'
+        UNION ALL SELECT 'reports_total', COUNT(*) FROM reports
+        UNION ALL SELECT 'prescriptions_total', COUNT(*) FROM prescriptions
+        ''',
+        '''
+        INSERT OR REPLACE INTO stats_daily_visits (day, visits)
+        SELECT last_visit, COUNT(*) FROM patients WHERE last_visit IS NOT NULL GROUP BY last_visit
+        ''',
+        '''
+        INSERT OR REPLACE INTO stats_author_counts (author, reports, prescriptions)
+        SELECT author, SUM(reports), SUM(prescriptions) FROM (
+            SELECT created_by AS author, COUNT(*) AS reports, 0 AS prescriptions FROM reports GROUP BY created_by
+            UNION ALL
+            SELECT prescribed_by, 0, COUNT(*) FROM prescriptions GROUP BY prescribed_by
+        ) GROUP BY author
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS stats_patients_insert AFTER INSERT ON patients BEGIN
+            UPDATE stats_counters SET value = value + CASE name
+                WHEN 'patients_total' THEN 1
+                WHEN 'patients_male' THEN new.sex = 'Male'
+                WHEN 'patients_female' THEN new.sex = 'Female'
+            END
+            WHERE name IN ('patients_total', 'patients_male', 'patients_female');
+            INSERT INTO stats_daily_visits (day, visits)
+            SELECT new.last_visit, 1 WHERE new.last_visit IS NOT NULL
+            ON CONFLICT (day) DO UPDATE SET visits = visits + 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS stats_patients_delete AFTER DELETE ON patients BEGIN
+            UPDATE stats_counters SET value = value - CASE name
+                WHEN 'patients_total' THEN 1
+                WHEN 'patients_male' THEN old.sex = 'Male'
+                WHEN 'patients_female' THEN old.sex = 'Female'
+            END
+            WHERE name IN ('patients_total', 'patients_male', 'patients_female');
+            UPDATE stats_daily_visits SET visits = visits - 1 WHERE day = old.last_visit;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS stats_patients_update_sex
+        AFTER UPDATE OF sex ON patients WHEN old.sex IS NOT new.sex BEGIN
+            UPDATE stats_counters SET value = value
+                + CASE name WHEN 'patients_male' THEN new.sex = 'Male' ELSE new.sex = 'Female' END
+                - CASE name WHEN 'patients_male' THEN old.sex = 'Male' ELSE old.sex = 'Female' END
+            WHERE name IN ('patients_male', 'patients_female');
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS stats_patients_update_visit
+        AFTER UPDATE OF last_visit ON patients WHEN old.last_visit IS NOT new.last_visit BEGIN
+            UPDATE stats_daily_visits SET visits = visits - 1 WHERE day = old.last_visit;
+            INSERT INTO stats_daily_visits (day, visits)
+            SELECT new.last_visit, 1 WHERE new.last_visit IS NOT NULL
+            ON CONFLICT (day) DO UPDATE SET visits = visits + 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS stats_reports_insert AFTER INSERT ON reports BEGIN
+            UPDATE stats_counters SET value = value + 1 WHERE name = 'reports_total';
+            INSERT INTO stats_author_counts (author, reports) VALUES (new.created_by, 1)
+            ON CONFLICT (author) DO UPDATE SET reports = reports + 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS stats_reports_delete AFTER DELETE ON reports BEGIN
+            UPDATE stats_counters SET value = value - 1 WHERE name = 'reports_total';
+            UPDATE stats_author_counts SET reports = reports - 1 WHERE author = old.created_by;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS stats_prescriptions_insert AFTER INSERT ON prescriptions BEGIN
+            UPDATE stats_counters SET value = value + 1 WHERE name = 'prescriptions_total';
+            INSERT INTO stats_author_counts (author, prescriptions) VALUES (new.prescribed_by, 1)
+            ON CONFLICT (author) DO UPDATE SET prescriptions = prescriptions + 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS stats_prescriptions_delete AFTER DELETE ON prescriptions BEGIN
+            UPDATE stats_counters SET value = value - 1 WHERE name = 'prescriptions_total';
+            UPDATE stats_author_counts SET prescriptions = prescriptions - 1 WHERE author = old.prescribed_by;
+        END
+        ''',
+    ]),
+    (6, "indexes for report and prescription filters", [
+        # Each filter column is followed by created_at so a filtered page is
+        # read in (created_at, id) order straight from the index
+        "CREATE INDEX IF NOT EXISTS idx_reports_created_by ON reports (created_by, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_reports_type ON reports (report_type, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_prescriptions_prescribed_by ON prescriptions (prescribed_by, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_prescriptions_medication ON prescriptions (medication_name, created_at)",
+        "ANALYZE",
+    ]),
+    (7, "index for the admin user listing", [
+        # role filter of GET /api/admin/users; the rowid makes it (role, id) ordered
+        "CREATE INDEX IF NOT EXISTS idx_users_role ON users (role)",
+    ]),
+    (8, "per-table change versions", [
+        # version goes up on every insert, update or delete of the table, from
+        # any connection or process; the API builds its ETags from it
+        '''
+        CREATE TABLE IF NOT EXISTS table_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+        ''',
+        *[f"INSERT OR IGNORE INTO table_versions (name) VALUES ('{table}')" for table in VERSIONED_TABLES],
+        *[
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_version_{event.lower()} AFTER {event} ON {table}
+            BEGIN
+                UPDATE table_versions SET version = version + 1, changed_at = CURRENT_TIMESTAMP
+                WHERE name = '{table}';
+            END
+            """
+            for table in VERSIONED_TABLES
+            for event in ("INSERT", "UPDATE", "DELETE")
+        ],
+    ]),
+    (9, "session versions", [
+        # carried in every session token; bumping it (logout, role change) revokes them
+        "ALTER TABLE users ADD COLUMN session_version INTEGER NOT NULL DEFAULT 0",
+    ]),
+    (10, "indexes for the patient list sorts", [
+        # GET /api/patients?sort=<column> orders by (IFNULL(column, ''), id): the
+        # expression must match the query's for SQLite to walk the index
+        *[
+            f"CREATE INDEX IF NOT EXISTS idx_patients_sort_{column} ON patients (IFNULL({column}, ''), id)"
+            for column in ("first_name", "last_name", "dob", "last_visit")
+        ],
+    ]),
+]
+
+
+def get_schema_version(conn):
+    """Return the highest applied migration version (0 for a fresh database)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    row = conn.execute("SELECT MAX(version) FROM schema_migrations").fetchone()
+    return row[0] or 0
+
+
+def migrate(db_path):
+    """
+    Apply every pending migration to the database at db_path.
+    Safe to call concurrently from several workers: each migration takes the
+    write lock first and re-checks the version before applying anything.
+    Returns the list of versions applied by this call.
+    """
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    applied = []
+    try:
+        for version, name, statements in MIGRATIONS:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if get_schema_version(conn) >= version:
+                    conn.execute("ROLLBACK")
+                    continue
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES (?, ?)",
+                    (version, name)
+                )
+                conn.execute("COMMIT")
+                applied.append(version)
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+    finally:
+        conn.close()
+    return applied
@@ -0,0 +1,133 @@
+"""
+مجمع اتصالات SQLite - SQLite connection pool
+
+Keeps a bounded set of open connections so the data tier does not pay for
+sqlite3.connect() + schema parsing on every call. Each connection is
+configured once (WAL journal, pragmas, statement cache) when it is created.
+"""
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Default pragmas applied to every new connection
+# journal_mode=WAL lets readers run while a writer commits
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -20000,       # negative value = size in KiB (~20 MB)
+    "mmap_size": 268435456,     # 256 MB memory-mapped I/O
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,       # milliseconds to wait on a locked database
+}
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of SQLite connections.
+
+    A thread that already holds a connection gets the same one back when it
+    asks again (nested data-tier calls share one connection). Idle
+    connections are reused most-recently-released first so their page and
+    statement caches stay warm.
+    """
+
+    def __init__(self, db_path, size=8, pragmas=None, statement_cache_size=128, timeout=30.0,
+                 factory=sqlite3.Connection):
+        self.db_path = db_path
+        self.size = size
+        self.pragmas = dict(DEFAULT_PRAGMAS)
+        if pragmas:
+            self.pragmas.update(pragmas)
+        self.statement_cache_size = statement_cache_size
+        self.timeout = timeout
+        self.factory = factory
+
+        self._idle = []
+        self._created = 0
+        self._cond = threading.Condition()
+        self._local = threading.local()
+
+    def connect(self):
+        """Open and configure a new connection"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.timeout,
+            check_same_thread=False,
+            cached_statements=self.statement_cache_size,
+            factory=self.factory,
+        )
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def acquire(self):
+        """Take a connection out of the pool, opening one if allowed"""
+        with self._cond:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                if self._created < self.size:
+                    self._created += 1
+                    break
+                if not self._cond.wait(self.timeout):
+                    raise sqlite3.OperationalError("Timed out waiting for a database connection")
+        try:
+            return self.connect()
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn):
+        """Return a connection to the pool, discarding any open transaction"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # Broken connection - drop it and let the pool open a new one
+            conn.close()
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            return
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager giving the calling thread a pooled connection.
+        Re-entrant: nested use in the same thread yields the same connection.
+        """
+        held = getattr(self._local, "conn", None)
+        if held is not None:
+            self._local.depth += 1
+            try:
+                yield held
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn = self.acquire()
+        self._local.conn = conn
+        self._local.depth = 1
+        try:
+            yield conn
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            self._local.conn = None
+            self._local.depth = 0
+            self.release(conn)
+
+    def close_all(self):
+        """Close every idle connection (used on shutdown)"""
+        with self._cond:
+            while self._idle:
+                self._idle.pop().close()
+                self._created -= 1
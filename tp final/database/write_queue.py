@@ -0,0 +1,162 @@
+"""
+طابور الكتابة مع الالتزام الجماعي - Single-writer queue with group commit
+
+All writes go through one writer thread that owns its own connection. The
+writer takes every mutation waiting in the queue (up to max_batch_size, or
+whatever arrived within max_latency of the first one) and runs them in a
+single transaction, so one fsync covers the whole batch instead of one per
+row. Each mutation runs inside its own SAVEPOINT: if it fails only that
+mutation is rolled back and only its caller sees the error.
+
+Mutations run in the context of the thread that queued them (contextvars),
+so request-scoped state such as the request's metrics follows the write.
+
+If the batch itself cannot be completed (a mutation ended the transaction,
+the savepoint is gone, COMMIT failed) the whole batch is rolled back, every
+caller in it gets the error and the writer carries on with the next batch,
+reconnecting if its connection is no longer usable. Callers never wait more
+than the queue's timeout for a result.
+"""
+import contextvars
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+_STOP = object()
+
+
+class WriteQueue:
+    """Batches data-tier writes from many requests into group commits"""
+
+    def __init__(self, connect, max_batch_size=64, max_latency=0.001, on_commit=None, timeout=30.0):
+        """
+        connect: function returning a new sqlite3 connection for the writer
+        max_batch_size: most mutations committed together
+        max_latency: seconds to wait for more mutations after the first one
+        on_commit: optional on_commit(batch_size, seconds) called after each COMMIT
+        timeout: seconds execute() waits for a result before raising TimeoutError
+        """
+        self._connect = connect
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.timeout = timeout
+        self.on_commit = on_commit
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args):
+        """
+        Queue fn(conn, *args) for the writer and return a Future with its
+        result, set once the batch containing it has been committed.
+        """
+        future = Future()
+        self._queue.put((fn, args, future, contextvars.copy_context()))
+        return future
+
+    def execute(self, fn, *args):
+        """
+        Queue a mutation and block until it is committed; returns its result.
+        Raises TimeoutError after self.timeout seconds. A mutation the writer
+        has not started yet is then dropped; one already running may still
+        be committed.
+        """
+        future = self.submit(fn, *args)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    def close(self):
+        """Finish queued writes and stop the writer thread"""
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _collect_batch(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_latency
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        conn = None
+        try:
+            while True:
+                first = self._queue.get()
+                if first is _STOP:
+                    return
+                # Callers that timed out before the writer got to them are skipped
+                batch = [item for item in self._collect_batch(first) if item[2].set_running_or_notify_cancel()]
+                if not batch:
+                    continue
+                try:
+                    if conn is None:
+                        conn = self._connect()
+                        # Transactions are managed explicitly below
+                        conn.isolation_level = None
+                    self._commit_batch(conn, batch)
+                except Exception as e:
+                    # The batch failed as a whole: nothing of it was committed
+                    for _, _, future, _ in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    if conn is not None and not self._reset(conn):
+                        conn.close()
+                        conn = None
+        finally:
+            if conn is not None:
+                conn.close()
+
+    @staticmethod
+    def _reset(conn):
+        """Roll back whatever a failed batch left open; False if the connection is unusable"""
+        try:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            return True
+        except Exception:
+            return False
+
+    def _commit_batch(self, conn, batch):
+        """
+        Run and commit one batch. A failing mutation is rolled back to its
+        savepoint; anything that breaks the batch itself is raised to _run.
+        """
+        conn.execute("BEGIN IMMEDIATE")
+
+        results = []
+        for fn, args, future, context in batch:
+            conn.execute("SAVEPOINT mutation")
+            try:
+                result = context.run(fn, conn, *args)
+            except Exception as e:
+                # Raises "no such savepoint" if the mutation ended the transaction
+                conn.execute("ROLLBACK TO mutation")
+                conn.execute("RELEASE mutation")
+                results.append((future, None, e))
+            else:
+                conn.execute("RELEASE mutation")
+                results.append((future, result, None))
+
+        start = time.perf_counter()
+        conn.execute("COMMIT")
+        elapsed = time.perf_counter() - start
+
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        if self.on_commit is not None:
+            self.on_commit(len(batch), elapsed)
@@ -0,0 +1,48 @@
+"""
+استيراد المرضى من ملف - Import patients from a CSV or NDJSON file
+
+Uses the same validation and chunked import as POST /api/patients/import,
+writing straight to the database (no server needed).
+
+Usage:
+    python import_patients.py legacy_patients.csv
+    python import_patients.py export.ndjson --chunk-size 5000
+"""
+import argparse
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("file", help="CSV (with a header row) or NDJSON file")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="default: from the file extension")
+    parser.add_argument("--chunk-size", type=int, default=None, help="rows per transaction")
+    args = parser.parse_args()
+
+    import_format = args.format or ("csv" if args.file.lower().endswith(".csv") else "ndjson")
+    file_path = os.path.abspath(args.file)
+
+    # main.py resolves static/ and templates/ relative to the working directory
+    os.chdir(BASE_DIR)
+    sys.path.insert(0, BASE_DIR)
+    import main
+
+    chunk_size = args.chunk_size or main.IMPORT_CHUNK_SIZE
+    with open(file_path, encoding="utf-8-sig", newline="") as stream:
+        result = main.import_patients(stream, import_format, chunk_size)
+    main.write_queue.close()
+
+    print(f"Imported: {result['imported']}")
+    print(f"Rejected: {result['failed']}")
+    for error in result["errors"]:
+        print(f"  row {error['row']}: {error['message']}")
+    if not result["success"]:
+        print(f"Stopped: {result['message']}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -1,80 +1,21 @@
 import sqlite3
 import os
 
+from database.migrations import migrate
+from security.passwords import hash_password
+
 # CREATE/USE database.db in the same folder as this file
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(BASE_DIR, "database.db")
+DB_PATH = os.environ.get("DB_PATH", os.path.join(BASE_DIR, "database.db"))
+
+# create or upgrade the schema (only pending migrations are applied)
+applied = migrate(DB_PATH)
+if applied:
+    print("Applied migrations:", ", ".join(str(v) for v in applied))
 
 conn = sqlite3.connect(DB_PATH)
 cur = conn.cursor()
 
-# users table (three users: doctor, nurse, pharma)
-cur.execute('''
-CREATE TABLE IF NOT EXISTS users (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    username TEXT UNIQUE NOT NULL,
-    password TEXT NOT NULL,
-    role TEXT NOT NULL
-)
-''')
-
-# patients table
-cur.execute('''
-CREATE TABLE IF NOT EXISTS patients (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    first_name TEXT,
-    last_name TEXT,
-    dob TEXT,
-    sex TEXT,
-    last_visit TEXT,
-    visit_place TEXT,
-    notes TEXT
-)
-''')
-
-# notifications table
-cur.execute('''
-CREATE TABLE IF NOT EXISTS notifications (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    title TEXT NOT NULL,
-    message TEXT NOT NULL,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    is_read INTEGER DEFAULT 0
-)
-''')
-
-# reports table (medical reports)
-cur.execute('''
-CREATE TABLE IF NOT EXISTS reports (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    patient_id INTEGER NOT NULL,
-    report_type TEXT NOT NULL,
-    diagnosis TEXT,
-    treatment TEXT,
-    medications TEXT,
-    notes TEXT,
-    created_by TEXT NOT NULL,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (patient_id) REFERENCES patients(id)
-)
-''')
-
-# prescriptions table (for doctors to add prescriptions)
-cur.execute('''
-CREATE TABLE IF NOT EXISTS prescriptions (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    patient_id INTEGER NOT NULL,
-    medication_name TEXT NOT NULL,
-    dosage TEXT NOT NULL,
-    frequency TEXT NOT NULL,
-    duration TEXT NOT NULL,
-    instructions TEXT,
-    prescribed_by TEXT NOT NULL,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (patient_id) REFERENCES patients(id)
-)
-''')
-
 # Insert default users (ignore errors if they already exist)
 users = [
     ("doctor", "1111", "Doctor"),
@@ -83,9 +24,11 @@ users = [
     ("admin", "admin123", "Admin"),
     ("Marwa", "marwa", "Nurse"), 
 ]
-for u in users:
+for username, password, role in users:
     try:
-        cur.execute("INSERT INTO users (username, password, role) VALUES (?, ?, ?)", u)
+        # Passwords are stored hashed (scrypt), never in plaintext
+        cur.execute("INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
+                    (username, hash_password(password), role))
     except sqlite3.IntegrityError:
         # user already exists, ignore
         pass
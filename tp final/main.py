@@ -1,33 +1,172 @@
-from fastapi import FastAPI, Form, Request, HTTPException, Header, Depends
-from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, Form, Request, HTTPException, Depends, UploadFile, File
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse, Response
 from fastapi.templating import Jinja2Templates
 from typing import Optional
+import asyncio
 import sqlite3
 import os
-from datetime import datetime
+import json
+import base64
+import secrets
+import hmac
+import csv
+import io
+import zlib
+from datetime import datetime, timezone
+from email.utils import format_datetime
 
 # Import our new middleware
-from middleware.auth_middleware import AuthMiddleware
+from middleware.auth_middleware import AuthMiddleware, SESSION_COOKIE
+from middleware.metrics_middleware import MetricsMiddleware
+from middleware.gzip_middleware import NegotiatingGZipMiddleware
+from database.pool import ConnectionPool
+from database.migrations import migrate
+from database.async_db import DatabaseExecutor
+from database.write_queue import WriteQueue
+from database.cache import RecordCache, TableVersionWatcher
+from database.instrumentation import SlowQueryLog, instrumented_connection
+from monitoring.metrics import MetricsRegistry, record_connection
+from realtime.broker import NotificationBroker, DROPPED
+from security.rbac import PolicyStore
+from security.sessions import SessionManager
+from security.passwords import PasswordHasher, LoginThrottle
+# orjson/msgspec-backed JSONResponse (stdlib json when neither is installed)
+from serialization.responses import FastJSONResponse as JSONResponse, RawJSON
+from assets.static_files import PrecompressedStaticFiles
+from assets.build import templates_dir
+from assets.pages import PageCache
+from assets.encoding import choose_encoding
 
-app = FastAPI()
+app = FastAPI(default_response_class=JSONResponse)
+
+# جلسات موقّعة - Signed session tokens issued by /login.
+# Set SESSION_SECRET when running several workers; otherwise each process
+# generates its own secret and sessions end when it restarts.
+SESSION_SECRET = os.environ.get("SESSION_SECRET") or secrets.token_urlsafe(32)
+SESSION_TTL = int(os.environ.get("SESSION_TTL", "28800"))
+SESSION_CACHE_SIZE = int(os.environ.get("SESSION_CACHE_SIZE", "4096"))
+# Seconds a worker trusts a user's session version before reading it again:
+# how long a logout, role change or delete elsewhere takes to revoke a token
+SESSION_RECHECK = float(os.environ.get("SESSION_RECHECK", "5"))
+session_manager = SessionManager(
+    SESSION_SECRET, ttl=SESSION_TTL, cache_size=SESSION_CACHE_SIZE,
+    session_version=lambda user_id: get_session_version_async(user_id), recheck=SESSION_RECHECK,
+)
+
+# مقاييس الأداء - Per-route latency and database metrics, served at GET /metrics
+# to admins, or to a scraper sending "Authorization: Bearer <METRICS_TOKEN>"
+# (unset: admin sessions only)
+metrics_registry = MetricsRegistry()
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN") or None
+
+# ضغط الردود - gzip for JSON/HTML bodies of at least GZIP_MIN_SIZE bytes (streams
+# that set their own Content-Encoding, SSE and precompressed static files are left alone)
+GZIP_MIN_SIZE = int(os.environ.get("GZIP_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", "6"))
 
 # Add our custom middleware
 def add_middleware(app):
-    app.add_middleware(AuthMiddleware)
+    app.add_middleware(AuthMiddleware, sessions=session_manager)
+    app.add_middleware(NegotiatingGZipMiddleware, minimum_size=GZIP_MIN_SIZE, compresslevel=GZIP_LEVEL)
+    # Added last = outermost, so authentication time is part of the measured latency
+    app.add_middleware(MetricsMiddleware, registry=metrics_registry)
 
 # Add middleware to the app
 add_middleware(app)
 
 # Database path
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(BASE_DIR, "database.db")
+DB_PATH = os.environ.get("DB_PATH", os.path.join(BASE_DIR, "database.db"))
+
+# إعدادات مجمع الاتصالات - Connection pool settings (overridable via environment)
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "8"))
+DB_STATEMENT_CACHE_SIZE = int(os.environ.get("DB_STATEMENT_CACHE_SIZE", "128"))
+DB_PRAGMAS = {
+    "synchronous": os.environ.get("DB_SYNCHRONOUS", "NORMAL"),
+    "cache_size": int(os.environ.get("DB_CACHE_SIZE", "-20000")),
+    "mmap_size": int(os.environ.get("DB_MMAP_SIZE", "268435456")),
+}
+
+# سجل الاستعلامات البطيئة - Statements slower than SLOW_QUERY_MS are logged
+# (logger "slow_query") with their EXPLAIN QUERY PLAN
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "100"))
+SLOW_QUERY_LOG_SIZE = int(os.environ.get("SLOW_QUERY_LOG_SIZE", "100"))
+slow_query_log = SlowQueryLog(
+    threshold_ms=SLOW_QUERY_MS,
+    keep=SLOW_QUERY_LOG_SIZE,
+    on_slow=metrics_registry.slow_queries.inc,
+)
+
+# تطبيق ترحيلات المخطط المعلقة - Bring the schema up to date before serving
+migrate(DB_PATH)
+
+db_pool = ConnectionPool(
+    DB_PATH,
+    size=DB_POOL_SIZE,
+    pragmas=DB_PRAGMAS,
+    statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+    factory=instrumented_connection(slow_query_log),
+)
+
+# طابور الكتابة - All writes are batched by one writer thread (group commit)
+WRITE_BATCH_SIZE = int(os.environ.get("WRITE_BATCH_SIZE", "64"))
+WRITE_BATCH_LATENCY_MS = float(os.environ.get("WRITE_BATCH_LATENCY_MS", "1"))
+WRITE_TIMEOUT_S = float(os.environ.get("WRITE_TIMEOUT_S", "30"))
+write_queue = WriteQueue(
+    db_pool.connect,
+    max_batch_size=WRITE_BATCH_SIZE,
+    max_latency=WRITE_BATCH_LATENCY_MS / 1000,
+    on_commit=metrics_registry.observe_commit,
+    timeout=WRITE_TIMEOUT_S,
+)
+
+# ذاكرة مؤقتة لسجلات المرضى - Patient record cache (shared by all requests of this worker)
+PATIENT_CACHE_SIZE = int(os.environ.get("PATIENT_CACHE_SIZE", "1024"))
+PATIENT_CACHE_TTL = float(os.environ.get("PATIENT_CACHE_TTL", "60"))
+# Seconds between two reads of the patients change version: how long a patient
+# written by another process can still be served from this worker's cache
+PATIENT_CACHE_RECHECK = float(os.environ.get("PATIENT_CACHE_RECHECK", "0.5"))
+patient_watcher = TableVersionWatcher(
+    lambda: get_table_versions("patients")[0][0], interval=PATIENT_CACHE_RECHECK
+)
+patient_cache = RecordCache(
+    max_size=PATIENT_CACHE_SIZE,
+    ttl=PATIENT_CACHE_TTL,
+    watcher=patient_watcher,
+)
+
+# منفذ قاعدة البيانات للدوال غير المتزامنة - Runs data-tier calls off the event loop
+# (writes are serialised by the write queue, so several can wait on it at once)
+db_executor = DatabaseExecutor(readers=DB_POOL_SIZE, writers=DB_POOL_SIZE)
+
+# تشفير كلمات المرور - Password KDF runs on its own bounded pool (PASSWORD_HASH_WORKERS at once)
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+password_hasher = PasswordHasher(workers=PASSWORD_HASH_WORKERS)
 
-# static folder
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Usernames with too many failed logins are refused for a while without running the KDF
+login_throttle = LoginThrottle(
+    max_failures=int(os.environ.get("LOGIN_MAX_FAILURES", "5")),
+    window=float(os.environ.get("LOGIN_FAILURE_WINDOW", "300")),
+)
 
-# templates folder
-templates = Jinja2Templates(directory="templates")
+# وسيط الإشعارات الفورية - Real-time notification broker (one queue per connected client)
+NOTIFICATION_QUEUE_SIZE = int(os.environ.get("NOTIFICATION_QUEUE_SIZE", "100"))
+notification_broker = NotificationBroker(queue_size=NOTIFICATION_QUEUE_SIZE)
+
+# static folder (build_assets.py writes hashed, precompressed files to static/dist)
+app.mount("/static", PrecompressedStaticFiles(directory="static"), name="static")
+
+# templates folder (templates/dist after build_assets.py, while it is up to date)
+templates = Jinja2Templates(directory=templates_dir(BASE_DIR))
+
+# صفحات HTML جاهزة - Rendered pages kept as bytes (re-rendered when a template file changes)
+PAGE_CACHE_SIZE = int(os.environ.get("PAGE_CACHE_SIZE", "64"))
+page_cache = PageCache(
+    templates,
+    max_size=PAGE_CACHE_SIZE,
+    bytecode_cache_dir=os.environ.get("TEMPLATE_BYTECODE_CACHE_DIR"),
+    gzip_level=GZIP_LEVEL,
+)
 
 # التحكم في الصلاحيات بناءً على الأدوار - Role-Based Access Control (RBAC)
 # تعريف الأدوار والصلاحيات المسموحة لكل دور
@@ -55,6 +194,14 @@ ROLE_PERMISSIONS = {
     }
 }
 
+# جدول الصلاحيات المُجمّع - ROLE_PERMISSIONS compiled to a bitmask table.
+# If the policy file exists it overrides ROLE_PERMISSIONS and is reloaded when it changes.
+RBAC_POLICY_FILE = os.environ.get("RBAC_POLICY_FILE", os.path.join(BASE_DIR, "rbac_policy.json"))
+rbac_policy = PolicyStore(ROLE_PERMISSIONS, RBAC_POLICY_FILE)
+
+# Dependency for endpoints: user: dict = require("patients", "read")
+require = rbac_policy.require
+
 # دالة للتحقق من صلاحيات المستخدم - Check user permissions
 def check_permission(role: str, resource: str, action: str) -> bool:
     """
@@ -69,238 +216,816 @@ def check_permission(role: str, resource: str, action: str) -> bool:
     Returns:
         True إذا كان المستخدم لديه الصلاحية، False خلاف ذلك
     """
-    if role not in ROLE_PERMISSIONS:
-        return False
-    
-    if resource not in ROLE_PERMISSIONS[role]:
-        return False
-    
-    return action in ROLE_PERMISSIONS[role][resource]
+    return rbac_policy.allows(role, resource, action)
 
-# دالة للحصول على بيانات المستخدم من الهيدر
-def get_current_user(x_user_role: Optional[str] = Header(None), 
-                      x_user_name: Optional[str] = Header(None)) -> dict:
+# دالة للحصول على بيانات المستخدم من الجلسة
+def get_current_user(request: Request) -> dict:
     """
-    الحصول على معلومات المستخدم الحالي من الهيدر
-    Get current user information from request headers
+    الحصول على معلومات المستخدم الحالي من رمز الجلسة
+    Get current user information from the verified session token
     """
-    if not x_user_role or not x_user_name:
+    user = request.scope.get("user")
+    if not user:
         raise HTTPException(status_code=401, detail="Unauthorized - No user credentials")
     
-    return {"role": x_user_role, "username": x_user_name}
+    return user
 
 # ============================================
 # TIER 3: DATA LAYER (Database Operations)
 # ============================================
 def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-def verify_user(username: str, password: str):
-    """Data Tier: Verify user credentials"""
-    conn = get_db_connection()
-    user = conn.execute(
-        "SELECT * FROM users WHERE username = ? AND password = ?",
-        (username, password)
-    ).fetchone()
-    conn.close()
+    """Data Tier: Borrow a pooled connection (use as a context manager)"""
+    record_connection()
+    return db_pool.connection()
+
+def get_user_credentials(username: str):
+    """Data Tier: Get a user with its stored password hash (for login)"""
+    with get_db_connection() as conn:
+        user = conn.execute(
+            "SELECT id, username, password, role, session_version FROM users WHERE username = ?",
+            (username,)
+        ).fetchone()
     return dict(user) if user else None
 
-def get_all_patients():
-    """Data Tier: Get all patients from database"""
-    conn = get_db_connection()
-    patients = conn.execute("SELECT * FROM patients ORDER BY id DESC").fetchall()
-    conn.close()
-    return [dict(patient) for patient in patients]
+def get_session_version(user_id: int):
+    """Data Tier: The user's current session version (None if the user is gone)"""
+    with get_db_connection() as conn:
+        row = conn.execute("SELECT session_version FROM users WHERE id = ?", (user_id,)).fetchone()
+    return row["session_version"] if row else None
 
-def add_patient_to_db(first_name, last_name, dob, sex, notes):
-    """Data Tier: Add patient to database"""
-    conn = get_db_connection()
-    visit_date = datetime.now().strftime("%Y-%m-%d")
-    cursor = conn.execute(
-        "INSERT INTO patients (first_name, last_name, dob, sex, last_visit, visit_place, notes) VALUES (?, ?, ?, ?, ?, ?, ?)",
-        (first_name, last_name, dob, sex, visit_date, "Clinic", notes)
-    )
-    patient_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    return patient_id
+def revoke_sessions(user_id: int):
+    """Data Tier: Invalidate every session token issued to the user so far"""
+    write_queue.execute(lambda conn: conn.execute(
+        "UPDATE users SET session_version = session_version + 1 WHERE id = ?", (user_id,)
+    ))
+    session_manager.forget(user_id)
+
+def update_user_password(user_id: int, password_hash: str):
+    """Data Tier: Replace a user's stored password hash"""
+    write_queue.execute(lambda conn: conn.execute(
+        "UPDATE users SET password = ? WHERE id = ?", (password_hash, user_id)
+    ))
+
+def fetch_json_rows(conn, query, params=()):
+    """
+    Data Tier: Run a query and get its rows as one JSON array (RawJSON)
+    SQLite builds each object with json_object(), so the rows never become
+    Python dicts and need no further encoding. Row order follows the
+    query's ORDER BY.
+    """
+    columns = [column[0] for column in conn.execute(f"SELECT * FROM ({query}) LIMIT 0", params).description]
+    pairs = ", ".join("'{0}', \"{0}\"".format(column) for column in columns)
+    cursor = conn.execute(f"SELECT json_object({pairs}) FROM ({query})", params)
+    cursor.row_factory = None
+    return RawJSON("[" + ",".join([row[0] for row in cursor.fetchall()]) + "]")
+
+def get_table_versions(*tables):
+    """
+    Data Tier: [(version, changed_at)] of tables, in the order asked
+    table_versions is kept by triggers, so every write from any connection
+    or process bumps it; reading it is one primary-key lookup per table.
+    """
+    placeholders = ", ".join("?" * len(tables))
+    with get_db_connection() as conn:
+        rows = conn.execute(
+            f"SELECT name, version, changed_at FROM table_versions WHERE name IN ({placeholders})", tables
+        ).fetchall()
+    versions = {row["name"]: (row["version"], row["changed_at"]) for row in rows}
+    return [versions.get(table, (0, None)) for table in tables]
+
+def get_all_patients_json():
+    """Data Tier: All patients as a pre-encoded JSON array (cached, for the list endpoint)"""
+    def load():
+        with get_db_connection() as conn:
+            return fetch_json_rows(conn, "SELECT * FROM patients ORDER BY id DESC")
+    return patient_cache.get_or_load("all_json", load)
+
+def invalidate_patient_cache(patient_id=None):
+    """Data Tier: Forget cached copies of a patient and of the patient list"""
+    if patient_id is None:
+        patient_cache.invalidate("all_json")
+    else:
+        patient_cache.invalidate("all_json", ("patient", patient_id))
+
+# الأعمدة المسموح بطلبها وترتيبها - Columns allowed in fields= and sort=
+PATIENT_COLUMNS = ("id", "first_name", "last_name", "dob", "sex", "last_visit", "visit_place", "notes")
+# every sort column other than id has an idx_patients_sort_<column> index (migration 10)
+PATIENT_SORT_COLUMNS = ("id", "first_name", "last_name", "dob", "last_visit")
+
+def encode_cursor(sort_value, row_id):
+    """Data Tier: Build an opaque keyset cursor from the last row of a page"""
+    raw = json.dumps([sort_value, row_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+# Range of an SQLite INTEGER: larger Python ints cannot be bound as parameters
+SQLITE_INT_MIN, SQLITE_INT_MAX = -(1 << 63), (1 << 63) - 1
+
+def is_cursor_value(value):
+    """Data Tier: Can value be bound as a query parameter? (text, number or NULL)"""
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, int):
+        return SQLITE_INT_MIN <= value <= SQLITE_INT_MAX
+    return value is None or isinstance(value, (str, float))
+
+def is_row_id(value):
+    """Data Tier: Is value an integer id SQLite can bind? (bool is rejected although it is an int)"""
+    return type(value) is int and SQLITE_INT_MIN <= value <= SQLITE_INT_MAX
+
+def failed_id(value):
+    """Data Tier: A rejected id as it can be echoed back (ints beyond 64 bits as text)"""
+    return str(value) if type(value) is int and not is_row_id(value) else value
+
+def decode_cursor(cursor):
+    """
+    Data Tier: Decode a keyset cursor into (sort_value, id)
+    Cursors come back from clients, so anything that is not what
+    encode_cursor() writes raises ValueError (a 400, never a 500): id must
+    be an integer, sort_value a single value or a list of them.
+    """
+    try:
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    parts = sort_value if isinstance(sort_value, list) else [sort_value]
+    if not isinstance(row_id, int) or not is_cursor_value(row_id) or not all(map(is_cursor_value, parts)):
+        raise ValueError("Invalid cursor")
+    return sort_value, row_id
+
+def get_patients_page(limit, cursor=None, fields=None, sort="id", order="desc"):
+    """
+    Data Tier: Get one page of patients using keyset pagination
+    Rows are ordered by (sort column, id) so the cursor stays stable while
+    patients are added or deleted between requests.
+    """
+    if sort not in PATIENT_SORT_COLUMNS:
+        raise ValueError(f"Cannot sort by '{sort}'")
+    if order not in ("asc", "desc"):
+        raise ValueError("order must be 'asc' or 'desc'")
+    fields = list(fields) if fields else list(PATIENT_COLUMNS)
+    for field in fields:
+        if field not in PATIENT_COLUMNS:
+            raise ValueError(f"Unknown field '{field}'")
+
+    # Always select id and the sort key: the cursor is built from them
+    select_columns = list(dict.fromkeys(["id", sort] + fields))
+    sort_key = "id" if sort == "id" else f"IFNULL({sort}, '')"
+    direction = "DESC" if order == "desc" else "ASC"
+    comparison = "<" if order == "desc" else ">"
+
+    query = f"SELECT {', '.join(select_columns)} FROM patients"
+    params = []
+    if cursor:
+        sort_value, last_id = decode_cursor(cursor)
+        if isinstance(sort_value, list):
+            raise ValueError("Invalid cursor")
+        if sort == "id":
+            query += f" WHERE id {comparison} ?"
+            params.append(last_id)
+        else:
+            # The first term lets SQLite seek in idx_patients_sort_<column>
+            # (it cannot seek on a row value over an expression index)
+            query += f" WHERE {sort_key} {comparison}= ? AND ({sort_key}, id) {comparison} (?, ?)"
+            params.extend([sort_value, sort_value, last_id])
+    if sort == "id":
+        query += f" ORDER BY id {direction}"
+    else:
+        query += f" ORDER BY {sort_key} {direction}, id {direction}"
+    query += " LIMIT ?"
+    params.append(limit)
 
-def add_notification(title, message):
-    """Data Tier: Add notification to database"""
-    conn = get_db_connection()
-    cursor = conn.execute(
-        "INSERT INTO notifications (title, message) VALUES (?, ?)",
+    with get_db_connection() as conn:
+        rows = conn.execute(query, params).fetchall()
+
+    next_cursor = None
+    if rows and len(rows) == limit:
+        last = rows[-1]
+        sort_value = last["id"] if sort == "id" else (last[sort] or "")
+        next_cursor = encode_cursor(sort_value, last["id"])
+    return [{field: row[field] for field in fields} for row in rows], next_cursor
+
+def count_patients():
+    """Data Tier: Get total number of patients (counter kept by triggers)"""
+    with get_db_connection() as conn:
+        result = conn.execute("SELECT value FROM stats_counters WHERE name = 'patients_total'").fetchone()
+    return result["value"] if result else 0
+
+def build_search_query(text):
+    """Data Tier: Turn free text into an FTS5 prefix query ("jo do" -> "jo"* AND "do"*)"""
+    terms = [term.replace('"', '""') for term in text.split()]
+    return " AND ".join(f'"{term}"*' for term in terms if term)
+
+def search_patients(text, limit=20, offset=0):
+    """
+    Data Tier: Search patients through the patients_fts index
+    Matches on first name, last name and notes, best matches first
+    (names weigh more than notes).
+    """
+    match = build_search_query(text)
+    if not match:
+        return []
+    with get_db_connection() as conn:
+        patients = conn.execute("""
+            SELECT p.*
+            FROM patients_fts
+            JOIN patients p ON p.id = patients_fts.rowid
+            WHERE patients_fts MATCH ?
+            ORDER BY bm25(patients_fts, 10.0, 10.0, 1.0), p.id DESC
+            LIMIT ? OFFSET ?
+        """, (match, limit, offset)).fetchall()
+    return [dict(patient) for patient in patients]
+
+def insert_notification(conn, title, message):
+    """Data Tier: Insert a notification inside an open transaction; returns the new row"""
+    return dict(conn.execute(
+        "INSERT INTO notifications (title, message) VALUES (?, ?) RETURNING *",
         (title, message)
-    )
-    notification_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    return notification_id
-
-def get_all_notifications():
-    """Data Tier: Get all notifications from database"""
-    conn = get_db_connection()
-    notifications = conn.execute("SELECT * FROM notifications ORDER BY created_at DESC LIMIT 20").fetchall()
-    conn.close()
+    ).fetchone())
+
+def publish_notification_event(event_type, **payload):
+    """Data Tier: Push a notification event to connected clients (no-op when nobody listens)"""
+    if not notification_broker.subscriber_count:
+        return
+    payload["type"] = event_type
+    payload["unread_count"] = get_unread_notifications_count()
+    notification_broker.publish(payload)
+
+def get_all_notifications(since_id=None, limit=20):
+    """
+    Data Tier: Get the latest notifications from database, newest first
+    With since_id the notifications newer than that id are returned oldest
+    first instead, so a client that is far behind pages forward from
+    since_id without skipping any.
+    """
+    with get_db_connection() as conn:
+        if since_id is None:
+            notifications = conn.execute(
+                "SELECT * FROM notifications ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        else:
+            notifications = conn.execute(
+                "SELECT * FROM notifications WHERE id > ? ORDER BY id ASC LIMIT ?",
+                (since_id, limit)
+            ).fetchall()
     return [dict(notif) for notif in notifications]
 
 def get_unread_notifications_count():
-    """Data Tier: Get count of unread notifications"""
-    conn = get_db_connection()
-    result = conn.execute("SELECT COUNT(*) as count FROM notifications WHERE is_read = 0").fetchone()
-    conn.close()
-    return result['count'] if result else 0
+    """Data Tier: Get count of unread notifications (counter kept by triggers)"""
+    with get_db_connection() as conn:
+        result = conn.execute("SELECT value FROM notification_counters WHERE name = 'unread'").fetchone()
+    return result['value'] if result else 0
 
 def mark_notification_as_read(notification_id):
     """Data Tier: Mark notification as read"""
-    conn = get_db_connection()
-    conn.execute("UPDATE notifications SET is_read = 1 WHERE id = ?", (notification_id,))
-    conn.commit()
-    conn.close()
+    write_queue.execute(lambda conn: conn.execute(
+        "UPDATE notifications SET is_read = 1 WHERE id = ?", (notification_id,)
+    ))
+    publish_notification_event("read", id=notification_id)
     return True
 
-def update_patient_in_db(patient_id, first_name, last_name, dob, sex, notes):
-    """Data Tier: Update patient in database"""
-    conn = get_db_connection()
-    conn.execute(
-        "UPDATE patients SET first_name = ?, last_name = ?, dob = ?, sex = ?, notes = ? WHERE id = ?",
-        (first_name, last_name, dob, sex, notes, patient_id)
-    )
-    conn.commit()
-    conn.close()
-    return True
-
-def delete_patient_from_db(patient_id):
-    """Data Tier: Delete patient from database"""
-    conn = get_db_connection()
-    conn.execute("DELETE FROM patients WHERE id = ?", (patient_id,))
-    conn.commit()
-    conn.close()
-    return True
+def mark_notifications_read_up_to(up_to_id):
+    """Data Tier: Mark every unread notification with id <= up_to_id as read"""
+    updated = write_queue.execute(lambda conn: conn.execute(
+        "UPDATE notifications SET is_read = 1 WHERE is_read = 0 AND id <= ?",
+        (up_to_id,)
+    ).rowcount)
+    if updated:
+        publish_notification_event("read_all", up_to_id=up_to_id)
+    return updated
 
 def get_patient_by_id(patient_id):
-    """Data Tier: Get single patient by ID"""
-    conn = get_db_connection()
-    patient = conn.execute("SELECT * FROM patients WHERE id = ?", (patient_id,)).fetchone()
-    conn.close()
+    """Data Tier: Get single patient by ID (cached); None for an id no row can have"""
+    if not is_row_id(patient_id):
+        return None
+    return patient_cache.get_or_load(("patient", patient_id), lambda: load_patient_by_id(patient_id))
+
+def load_patient_by_id(patient_id):
+    """Data Tier: Read a single patient, bypassing the cache"""
+    with get_db_connection() as conn:
+        patient = conn.execute("SELECT * FROM patients WHERE id = ?", (patient_id,)).fetchone()
     return dict(patient) if patient else None
 
-def get_statistics():
-    """Data Tier: Get system statistics for reports"""
-    conn = get_db_connection()
-    
-    # Total patients
-    total_patients = conn.execute("SELECT COUNT(*) as count FROM patients").fetchone()['count']
-    
-    # Patients by gender
-    male_count = conn.execute("SELECT COUNT(*) as count FROM patients WHERE sex = 'Male'").fetchone()['count']
-    female_count = conn.execute("SELECT COUNT(*) as count FROM patients WHERE sex = 'Female'").fetchone()['count']
-    
-    # Recent patients (last 7 days)
-    recent = conn.execute(
-        "SELECT COUNT(*) as count FROM patients WHERE last_visit >= date('now', '-7 days')"
-    ).fetchone()['count']
-    
-    conn.close()
+# الملف الزمني للمريض - Per-patient timeline of reports and prescriptions
+# type -> (table, resource in ROLE_PERMISSIONS, fields returned for that type)
+TIMELINE_SOURCES = {
+    "report": ("reports", "reports",
+               ("report_type", "diagnosis", "treatment", "medications", "notes", "created_by")),
+    "prescription": ("prescriptions", "prescriptions",
+                     ("medication_name", "dosage", "frequency", "duration", "instructions", "prescribed_by")),
+}
+
+def get_patient_timeline(patient_id, entry_types, limit=50, cursor=None):
+    """
+    Data Tier: One page of a patient's reports and prescriptions, newest first
+    entry_types: subset of TIMELINE_SOURCES to include. Each source is read
+    through its (patient_id, created_at) index and limited on its own
+    before the UNION ALL, so a page never scans the patient's full history.
+    Returns (entries, next_cursor).
+    """
+    if not entry_types:
+        return [], None
+    all_fields = [field for source in TIMELINE_SOURCES.values() for field in source[2]]
+    if cursor:
+        sort_value, last_id = decode_cursor(cursor)
+        if not (isinstance(sort_value, list) and len(sort_value) == 2):
+            raise ValueError("Invalid cursor")
+        created_at, last_type = sort_value
+
+    branches, params = [], []
+    for entry_type in entry_types:
+        table, _, fields = TIMELINE_SOURCES[entry_type]
+        columns = ", ".join(field if field in fields else f"NULL AS {field}" for field in all_fields)
+        where = "patient_id = ?"
+        params.append(patient_id)
+        if cursor:
+            where += " AND (created_at, ?, id) < (?, ?, ?)"
+            params.extend([entry_type, created_at, last_type, last_id])
+        branches.append(f"""
+            SELECT * FROM (
+                SELECT '{entry_type}' AS type, id, created_at, {columns}
+                FROM {table}
+                WHERE {where}
+                ORDER BY created_at DESC, id DESC
+                LIMIT ?
+            )""")
+        params.append(limit)
+
+    query = " UNION ALL ".join(branches) + " ORDER BY created_at DESC, type DESC, id DESC LIMIT ?"
+    params.append(limit)
+    with get_db_connection() as conn:
+        rows = conn.execute(query, params).fetchall()
+
+    entries = [
+        dict({"type": row["type"], "id": row["id"], "created_at": row["created_at"]},
+             **{field: row[field] for field in TIMELINE_SOURCES[row["type"]][2]})
+        for row in rows
+    ]
+    next_cursor = None
+    if len(rows) == limit:
+        last = rows[-1]
+        next_cursor = encode_cursor([last["created_at"], last["type"]], last["id"])
+    return entries, next_cursor
+
+def get_dashboard_statistics(days=30):
+    """
+    Data Tier: Dashboard statistics from the materialized stats tables
+    (kept current by triggers, so the cost does not grow with the data)
+    """
+    with get_db_connection() as conn:
+        counters = {
+            row["name"]: row["value"]
+            for row in conn.execute("SELECT name, value FROM stats_counters").fetchall()
+        }
+        recent = conn.execute(
+            "SELECT IFNULL(SUM(visits), 0) AS count FROM stats_daily_visits WHERE day >= date('now', '-7 days')"
+        ).fetchone()["count"]
+        visits_per_day = conn.execute(
+            "SELECT day, visits FROM stats_daily_visits WHERE day >= date('now', ?) AND visits > 0 ORDER BY day",
+            (f"-{int(days)} days",)
+        ).fetchall()
+        per_doctor = conn.execute(
+            "SELECT author, reports, prescriptions FROM stats_author_counts "
+            "WHERE reports > 0 OR prescriptions > 0 ORDER BY author"
+        ).fetchall()
     return {
-        'total_patients': total_patients,
-        'male_patients': male_count,
-        'female_patients': female_count,
-        'recent_visits': recent
+        'total_patients': counters.get('patients_total', 0),
+        'male_patients': counters.get('patients_male', 0),
+        'female_patients': counters.get('patients_female', 0),
+        'recent_visits': recent,
+        'total_reports': counters.get('reports_total', 0),
+        'total_prescriptions': counters.get('prescriptions_total', 0),
+        'visits_per_day': [dict(row) for row in visits_per_day],
+        'per_doctor': [dict(row) for row in per_doctor]
     }
 
 # ==============================
 # User Management Functions
 # ==============================
 
-def get_all_users():
-    """Get all users from database"""
-    conn = get_db_connection()
-    users = conn.execute("SELECT id, username, role FROM users ORDER BY id").fetchall()
-    conn.close()
-    return [dict(user) for user in users]
+# الأدوار التي يمكن للمدير منحها - Roles an admin can give (never Admin)
+USER_ROLES = ("Doctor", "Nurse", "Pharmacist")
 
-def add_user_to_db(username, password, role):
-    """Add new user to database"""
-    conn = get_db_connection()
+def get_users_page(role=None, prefix=None, limit=None, cursor=None):
+    """
+    Data Tier: Non-admin users ordered by id, optionally by role and username prefix
+    role uses idx_users_role and prefix is a range on the UNIQUE username
+    index. Without limit every matching user is returned.
+    Returns (users, next_cursor).
+    """
+    conditions, params = ["role != 'Admin'"], []
+    if role:
+        conditions.append("role = ?")
+        params.append(role)
+    if prefix:
+        # Range scan instead of LIKE (LIKE is case-insensitive and skips the index)
+        conditions.append("username >= ? AND username < ?")
+        params.extend([prefix, prefix + "\U0010ffff"])
+    if cursor:
+        _, last_id = decode_cursor(cursor)
+        conditions.append("id > ?")
+        params.append(last_id)
+    query = f"SELECT id, username, role FROM users WHERE {' AND '.join(conditions)} ORDER BY id"
+    if limit:
+        query += " LIMIT ?"
+        params.append(limit)
+
+    with get_db_connection() as conn:
+        users = [dict(user) for user in conn.execute(query, params).fetchall()]
+
+    next_cursor = None
+    if limit and len(users) == limit:
+        next_cursor = encode_cursor(None, users[-1]["id"])
+    return users, next_cursor
+
+def add_user_to_db(username, password_hash, role):
+    """Add new user to database (password already hashed by password_hasher)"""
     try:
-        cursor = conn.execute(
+        return write_queue.execute(lambda conn: conn.execute(
             "INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
-            (username, password, role)
-        )
-        user_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        return user_id
+            (username, password_hash, role)
+        ).lastrowid)
     except sqlite3.IntegrityError:
-        conn.close()
         raise Exception("Username already exists")
 
-def delete_user_from_db(user_id):
-    """Delete user from database"""
-    conn = get_db_connection()
-    # Prevent deleting the admin user
-    admin_check = conn.execute("SELECT role FROM users WHERE id = ?", (user_id,)).fetchone()
-    if admin_check and admin_check['role'] == 'Admin':
-        conn.close()
-        raise Exception("Cannot delete admin user")
-    
-    conn.execute("DELETE FROM users WHERE id = ?", (user_id,))
-    conn.commit()
-    conn.close()
+def add_users_to_db(users):
+    """
+    Data Tier: Insert (username, password_hash, role) rows in one transaction
+    Returns the new id of each row, or None where the username was taken
+    (the UNIQUE constraint decides, including duplicates within users).
+    """
+    def insert(conn):
+        ids = []
+        for username, password_hash, role in users:
+            row = conn.execute(
+                "INSERT INTO users (username, password, role) VALUES (?, ?, ?) "
+                "ON CONFLICT (username) DO NOTHING RETURNING id",
+                (username, password_hash, role)
+            ).fetchone()
+            ids.append(row["id"] if row else None)
+        return ids
+
+    return write_queue.execute(insert)
+
+def change_users(conn, statement, items, admin_message):
+    """
+    Data Tier: Run statement (guarded by role != 'Admin') once per (params, user_id)
+    Returns (done ids, [{"id", "message"}] for users that are missing or admins).
+    """
+    done, missing = [], []
+    for params, user_id in items:
+        if conn.execute(statement + " RETURNING id", params).fetchone():
+            done.append(user_id)
+        else:
+            missing.append(user_id)
+    failed = []
+    if missing:
+        placeholders = ", ".join("?" * len(missing))
+        roles = {
+            row["id"]: row["role"]
+            for row in conn.execute(f"SELECT id, role FROM users WHERE id IN ({placeholders})", missing).fetchall()
+        }
+        failed = [
+            {"id": user_id, "message": admin_message if roles.get(user_id) == "Admin" else "User not found"}
+            for user_id in missing
+        ]
+    return done, failed
+
+def update_user_roles_in_db(changes):
+    """
+    Data Tier: Apply [(user_id, role)] in one transaction; admins are never changed
+    A user whose role really changes loses the sessions issued with the old role.
+    """
+    done, failed = write_queue.execute(lambda conn: change_users(
+        conn,
+        "UPDATE users SET session_version = session_version + (role IS NOT ?), role = ? "
+        "WHERE id = ? AND role != 'Admin'",
+        [((role, role, user_id), user_id) for user_id, role in changes],
+        "Cannot modify admin user"
+    ))
+    session_manager.forget(*done)
+    return done, failed
+
+def delete_users_from_db(user_ids):
+    """Data Tier: Delete users in one transaction (ending their sessions); admins are never deleted"""
+    done, failed = write_queue.execute(lambda conn: change_users(
+        conn, "DELETE FROM users WHERE id = ? AND role != 'Admin'",
+        [((user_id,), user_id) for user_id in user_ids],
+        "Cannot delete admin user"
+    ))
+    session_manager.forget(*done)
+    return done, failed
+
+
+REPORTS_LIST_QUERY = """
+    SELECT r.*, p.first_name, p.last_name 
+    FROM reports r 
+    JOIN patients p ON r.patient_id = p.id 
+    ORDER BY r.created_at DESC
+"""
+
+def get_all_reports_json():
+    """Data Tier: All reports as a pre-encoded JSON array"""
+    with get_db_connection() as conn:
+        return fetch_json_rows(conn, REPORTS_LIST_QUERY)
+
+PRESCRIPTIONS_LIST_QUERY = """
+    SELECT p.*, pt.first_name, pt.last_name 
+    FROM prescriptions p 
+    JOIN patients pt ON p.patient_id = pt.id 
+    ORDER BY p.created_at DESC
+"""
+
+def get_all_prescriptions_json():
+    """Data Tier: All prescriptions as a pre-encoded JSON array"""
+    with get_db_connection() as conn:
+        return fetch_json_rows(conn, PRESCRIPTIONS_LIST_QUERY)
+
+# resource -> (query without ORDER BY, table alias, columns that can be filtered on)
+RECORD_PAGE_QUERIES = {
+    "reports": ("""
+        SELECT r.*, p.first_name, p.last_name
+        FROM reports r
+        JOIN patients p ON r.patient_id = p.id
+    """, "r", ("patient_id", "created_by", "report_type")),
+    "prescriptions": ("""
+        SELECT p.*, pt.first_name, pt.last_name
+        FROM prescriptions p
+        JOIN patients pt ON p.patient_id = pt.id
+    """, "p", ("patient_id", "prescribed_by", "medication_name")),
+}
+
+def get_records_page(resource, filters, date_from=None, date_to=None, limit=50, cursor=None):
+    """
+    Data Tier: One page of reports or prescriptions, newest first
+    filters: {column: value} for the resource's filter columns (None = any).
+    Keyset pagination on (created_at, id); every filter has an index
+    ending in created_at (migration 6), so a page only reads matching rows.
+    Returns (rows, next_cursor).
+    """
+    query, alias, filter_columns = RECORD_PAGE_QUERIES[resource]
+    conditions, params = [], []
+    for column in filter_columns:
+        if filters.get(column) is not None:
+            conditions.append(f"{alias}.{column} = ?")
+            params.append(filters[column])
+    if date_from:
+        conditions.append(f"{alias}.created_at >= ?")
+        params.append(date_from)
+    if date_to:
+        conditions.append(f"{alias}.created_at < date(?, '+1 day')")
+        params.append(date_to)
+    if cursor:
+        created_at, last_id = decode_cursor(cursor)
+        if not isinstance(created_at, str):
+            raise ValueError("Invalid cursor")
+        conditions.append(f"({alias}.created_at, {alias}.id) < (?, ?)")
+        params.extend([created_at, last_id])
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += f" ORDER BY {alias}.created_at DESC, {alias}.id DESC LIMIT ?"
+    params.append(limit)
+
+    with get_db_connection() as conn:
+        rows = [dict(row) for row in conn.execute(query, params).fetchall()]
+
+    next_cursor = None
+    if len(rows) == limit:
+        next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+    return rows, next_cursor
+
+# ==============================
+# Bulk export (streamed, constant memory)
+# ==============================
+# التصدير الكامل على دفعات - Rows are read with fetchmany() from one cursor and
+# encoded batch by batch, so memory does not grow with the table size.
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", "500"))
+
+# resource -> (query, date column used by date_from/date_to, id column)
+EXPORT_QUERIES = {
+    "patients": ("SELECT " + ", ".join(PATIENT_COLUMNS) + " FROM patients", "last_visit", "id"),
+    "reports": ("""
+        SELECT r.*, p.first_name, p.last_name
+        FROM reports r
+        JOIN patients p ON r.patient_id = p.id
+    """, "r.created_at", "r.id"),
+    "prescriptions": ("""
+        SELECT p.*, pt.first_name, pt.last_name
+        FROM prescriptions p
+        JOIN patients pt ON p.patient_id = pt.id
+    """, "p.created_at", "p.id"),
+}
+
+def iter_export_rows(resource, date_from=None, date_to=None, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Data Tier: Stream a whole table for export
+    Yields the column names first, then lists of row tuples (batch_size
+    at a time). date_from/date_to are inclusive YYYY-MM-DD bounds.
+
+    The pooled connection is held until the generator finishes or is
+    closed; the generator may be resumed from different threads, so it
+    uses acquire()/release() rather than the per-thread connection().
+    """
+    query, date_column, id_column = EXPORT_QUERIES[resource]
+    conditions, params = [], []
+    if date_from:
+        conditions.append(f"{date_column} >= ?")
+        params.append(date_from)
+    if date_to:
+        conditions.append(f"{date_column} < date(?, '+1 day')")
+        params.append(date_to)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += f" ORDER BY {id_column}"
+
+    conn = db_pool.acquire()
+    record_connection()
+    try:
+        cursor = conn.cursor()
+        # Plain tuples: no sqlite3.Row object per row
+        cursor.row_factory = None
+        cursor.execute(query, params)
+        yield [column[0] for column in cursor.description]
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+        cursor.close()
+    finally:
+        db_pool.release(conn)
+
+# ==============================
+# Unit of Work (domain write + notification in one transaction)
+# ==============================
+# كل عملية هنا تُنفذ كمعاملة واحدة: إما أن ينجح كل شيء أو لا شيء
+# Each function below is one mutation on the write queue, so the domain row
+# and its notification are committed together (or not at all).
+
+def run_unit_of_work(work, *args):
+    """Data Tier: Run work(conn, *args) atomically and return its result"""
+    return write_queue.execute(work, *args)
+
+def run_patient_write(work):
+    """
+    Data Tier: run_unit_of_work for a write to patients
+    The patients version is read around the write (no one else can write in
+    between) so the patient cache knows the change was ours and keeps its
+    other entries; the caller still invalidates what it changed.
+    """
+    def tracked(conn):
+        before = conn.execute("SELECT version FROM table_versions WHERE name = 'patients'").fetchone()[0]
+        result = work(conn)
+        after = conn.execute("SELECT version FROM table_versions WHERE name = 'patients'").fetchone()[0]
+        return result, before, after
+
+    result, before, after = run_unit_of_work(tracked)
+    patient_watcher.advance(before, after)
+    return result
+
+def register_patient_with_notification(first_name, last_name, dob, sex, notes):
+    """Data Tier: Insert a patient and its "New Patient Added" notification"""
+    visit_date = datetime.now().strftime("%Y-%m-%d")
+
+    def work(conn):
+        patient_id = conn.execute(
+            "INSERT INTO patients (first_name, last_name, dob, sex, last_visit, visit_place, notes) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (first_name, last_name, dob, sex, visit_date, "Clinic", notes)
+        ).lastrowid
+        notification = insert_notification(
+            conn, "New Patient Added",
+            f"Patient {first_name} {last_name} has been successfully registered (ID: {patient_id})"
+        )
+        return patient_id, notification
+
+    patient_id, notification = run_patient_write(work)
+    invalidate_patient_cache()
+    publish_notification_event("notification", notification=notification)
+    return patient_id
+
+def update_patient_with_notification(patient_id, first_name, last_name, dob, sex, notes):
+    """Data Tier: Update a patient and add a "Patient Updated" notification"""
+    def work(conn):
+        updated = conn.execute(
+            "UPDATE patients SET first_name = ?, last_name = ?, dob = ?, sex = ?, notes = ? WHERE id = ?",
+            (first_name, last_name, dob, sex, notes, patient_id)
+        ).rowcount
+        if not updated:
+            raise ValueError("Patient not found")
+        return insert_notification(
+            conn, "Patient Updated",
+            f"Patient {first_name} {last_name} (ID: {patient_id}) has been updated"
+        )
+
+    notification = run_patient_write(work)
+    invalidate_patient_cache(patient_id)
+    publish_notification_event("notification", notification=notification)
     return True
 
+def delete_patient_with_notification(patient_id):
+    """Data Tier: Delete a patient and add a "Patient Deleted" notification; None if not found"""
+    def work(conn):
+        patient = conn.execute(
+            "DELETE FROM patients WHERE id = ? RETURNING *", (patient_id,)
+        ).fetchone()
+        if patient is None:
+            return None, None
+        notification = insert_notification(
+            conn, "Patient Deleted",
+            f"Patient {patient['first_name']} {patient['last_name']} (ID: {patient_id}) has been deleted"
+        )
+        return dict(patient), notification
 
-def get_all_reports():
-    """Data Tier: Get all reports from database"""
-    conn = get_db_connection()
-    reports = conn.execute("""
-        SELECT r.*, p.first_name, p.last_name 
-        FROM reports r 
-        JOIN patients p ON r.patient_id = p.id 
-        ORDER BY r.created_at DESC
-    """).fetchall()
-    conn.close()
-    return [dict(report) for report in reports]
-
-def add_report_to_db(patient_id, report_type, diagnosis, treatment, medications, notes, created_by):
-    """Data Tier: Add report to database"""
-    conn = get_db_connection()
-    cursor = conn.execute(
-        "INSERT INTO reports (patient_id, report_type, diagnosis, treatment, medications, notes, created_by) VALUES (?, ?, ?, ?, ?, ?, ?)",
-        (patient_id, report_type, diagnosis, treatment, medications, notes, created_by)
-    )
-    report_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    patient, notification = run_patient_write(work)
+    invalidate_patient_cache(patient_id)
+    if notification:
+        publish_notification_event("notification", notification=notification)
+    return patient
+
+def add_report_with_notification(patient_id, report_type, diagnosis, treatment, medications, notes, created_by):
+    """Data Tier: Insert a report and its notification; the patient name comes from RETURNING"""
+    def work(conn):
+        # INSERT ... SELECT FROM patients only inserts when the patient exists
+        row = conn.execute("""
+            INSERT INTO reports (patient_id, report_type, diagnosis, treatment, medications, notes, created_by)
+            SELECT id, ?, ?, ?, ?, ?, ? FROM patients WHERE id = ?
+            RETURNING id,
+                (SELECT first_name FROM patients WHERE patients.id = reports.patient_id) AS first_name,
+                (SELECT last_name FROM patients WHERE patients.id = reports.patient_id) AS last_name
+        """, (report_type, diagnosis, treatment, medications, notes, created_by, patient_id)).fetchone()
+        if row is None:
+            raise ValueError("Patient not found")
+        notification = insert_notification(
+            conn, "New Report Created",
+            f"New {report_type} report created for patient {row['first_name']} {row['last_name']}"
+        )
+        return row["id"], notification
+
+    report_id, notification = run_unit_of_work(work)
+    publish_notification_event("notification", notification=notification)
     return report_id
 
-def get_all_prescriptions():
-    """Data Tier: Get all prescriptions from database"""
-    conn = get_db_connection()
-    prescriptions = conn.execute("""
-        SELECT p.*, pt.first_name, pt.last_name 
-        FROM prescriptions p 
-        JOIN patients pt ON p.patient_id = pt.id 
-        ORDER BY p.created_at DESC
-    """).fetchall()
-    conn.close()
-    return [dict(prescription) for prescription in prescriptions]
-
-def add_prescription_to_db(patient_id, medication_name, dosage, frequency, duration, instructions, prescribed_by):
-    """Data Tier: Add prescription to database"""
-    conn = get_db_connection()
-    cursor = conn.execute(
-        "INSERT INTO prescriptions (patient_id, medication_name, dosage, frequency, duration, instructions, prescribed_by) VALUES (?, ?, ?, ?, ?, ?, ?)",
-        (patient_id, medication_name, dosage, frequency, duration, instructions, prescribed_by)
-    )
-    prescription_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+def add_prescription_with_notification(patient_id, medication_name, dosage, frequency, duration, instructions, prescribed_by):
+    """Data Tier: Insert a prescription and its notification; the patient name comes from RETURNING"""
+    def work(conn):
+        row = conn.execute("""
+            INSERT INTO prescriptions (patient_id, medication_name, dosage, frequency, duration, instructions, prescribed_by)
+            SELECT id, ?, ?, ?, ?, ?, ? FROM patients WHERE id = ?
+            RETURNING id,
+                (SELECT first_name FROM patients WHERE patients.id = prescriptions.patient_id) AS first_name,
+                (SELECT last_name FROM patients WHERE patients.id = prescriptions.patient_id) AS last_name
+        """, (medication_name, dosage, frequency, duration, instructions, prescribed_by, patient_id)).fetchone()
+        if row is None:
+            raise ValueError("Patient not found")
+        notification = insert_notification(
+            conn, "New Prescription Added",
+            f"New prescription for {medication_name} added for patient {row['first_name']} {row['last_name']}"
+        )
+        return row["id"], notification
+
+    prescription_id, notification = run_unit_of_work(work)
+    publish_notification_event("notification", notification=notification)
     return prescription_id
 
+def import_patient_batch(rows):
+    """
+    Data Tier: Insert a chunk of validated patients with executemany, plus
+    one summary notification, in a single transaction
+    rows: tuples of (first_name, last_name, dob, sex, last_visit, visit_place, notes)
+    """
+    def work(conn):
+        conn.executemany(
+            "INSERT INTO patients (first_name, last_name, dob, sex, last_visit, visit_place, notes) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        return insert_notification(
+            conn, "Patients Imported",
+            f"{len(rows)} patients have been imported"
+        )
+
+    notification = run_patient_write(work)
+    invalidate_patient_cache()
+    publish_notification_event("notification", notification=notification)
+    return len(rows)
+
+# ==============================
+# Async Data Tier (for async endpoints)
+# ==============================
+# نسخ غير متزامنة من دوال طبقة البيانات - awaitable versions of the functions above
+get_patient_by_id_async = db_executor.wrap(get_patient_by_id)
+get_unread_notifications_count_async = db_executor.wrap(get_unread_notifications_count)
+get_users_page_async = db_executor.wrap(get_users_page)
+get_table_versions_async = db_executor.wrap(get_table_versions)
+get_user_credentials_async = db_executor.wrap(get_user_credentials)
+get_session_version_async = db_executor.wrap(get_session_version)
+update_user_password_async = db_executor.wrap(update_user_password, write=True)
+update_patient_with_notification_async = db_executor.wrap(update_patient_with_notification, write=True)
+add_report_with_notification_async = db_executor.wrap(add_report_with_notification, write=True)
+add_prescription_with_notification_async = db_executor.wrap(add_prescription_with_notification, write=True)
+add_user_to_db_async = db_executor.wrap(add_user_to_db, write=True)
+add_users_to_db_async = db_executor.wrap(add_users_to_db, write=True)
+update_user_roles_in_db_async = db_executor.wrap(update_user_roles_in_db, write=True)
+delete_users_from_db_async = db_executor.wrap(delete_users_from_db, write=True)
+
 # ============================================
 # TIER 2: BUSINESS LOGIC LAYER
 # ============================================
@@ -314,6 +1039,191 @@ def validate_patient_data(first_name, last_name, dob, sex):
         return False, "Invalid gender"
     return True, "Valid"
 
+def validate_user_data(username, password, role):
+    """Business Tier: Validate a user created by the admin"""
+    if not isinstance(username, str) or not username.strip():
+        return False, "Username is required"
+    if not isinstance(password, str) or not password:
+        return False, "Password is required"
+    if role not in USER_ROLES:
+        return False, "Invalid role"
+    return True, "Valid"
+
+# Most users per bulk request (each new user costs one password hash)
+ADMIN_BULK_MAX = int(os.environ.get("ADMIN_BULK_MAX", "500"))
+
+async def create_users(entries):
+    """
+    Business Tier: Create many users in one transaction (onboarding a ward)
+    Passwords are hashed on the KDF pool, PASSWORD_HASH_WORKERS at a time.
+    Returns the response body: created users and the rejected entries.
+    """
+    failed, valid = [], []
+    for index, entry in enumerate(entries):
+        entry = entry if isinstance(entry, dict) else {}
+        username, password, role = entry.get("username"), entry.get("password"), entry.get("role")
+        is_valid, message = validate_user_data(username, password, role)
+        if is_valid:
+            valid.append((index, username, password, role))
+        else:
+            failed.append({"index": index, "username": username, "message": message})
+
+    hashes = await asyncio.gather(*(password_hasher.hash(password) for _, _, password, _ in valid))
+    ids = await add_users_to_db_async(
+        [(username, password_hash, role) for (_, username, _, role), password_hash in zip(valid, hashes)]
+    ) if valid else []
+
+    created = []
+    for (index, username, _, role), user_id in zip(valid, ids):
+        if user_id is None:
+            failed.append({"index": index, "username": username, "message": "Username already exists"})
+        else:
+            created.append({"id": user_id, "username": username, "role": role})
+    failed.sort(key=lambda item: item["index"])
+    return {"success": True, "created": created, "failed": failed}
+
+async def authenticate_user(username, password):
+    """
+    Business Tier: Check credentials without blocking the event loop
+    Returns the user, None for wrong credentials, or False if the username
+    is throttled after too many failures.
+    """
+    if login_throttle.blocked(username):
+        return False
+
+    user = await get_user_credentials_async(username)
+    if user is None:
+        matches, needs_rehash = await password_hasher.verify_missing_user(password)
+    else:
+        matches, needs_rehash = await password_hasher.verify(password, user["password"])
+
+    if not matches:
+        login_throttle.record_failure(username)
+        return None
+    login_throttle.reset(username)
+
+    # Plaintext or outdated hash: store a fresh hash now that we know the password
+    if needs_rehash:
+        await update_user_password_async(user["id"], await password_hasher.hash(password))
+    return {
+        "id": user["id"], "username": user["username"], "role": user["role"],
+        "session_version": user["session_version"],
+    }
+
+# استيراد المرضى على دفعات - Bulk import settings
+IMPORT_CHUNK_SIZE = int(os.environ.get("IMPORT_CHUNK_SIZE", "1000"))
+# Only the first errors are reported row by row; the rest are just counted
+IMPORT_MAX_ERRORS = int(os.environ.get("IMPORT_MAX_ERRORS", "1000"))
+# Columns read from an import row
+IMPORT_FIELDS = ("first_name", "last_name", "dob", "sex", "last_visit", "visit_place", "notes")
+
+def validate_date_filters(*values):
+    """Business Tier: Check optional YYYY-MM-DD filter values; returns an error message or None"""
+    for value in values:
+        if value:
+            try:
+                datetime.strptime(value, "%Y-%m-%d")
+            except ValueError:
+                return "Dates must be YYYY-MM-DD"
+    return None
+
+def list_records(resource, filters, date_from, date_to, limit, cursor):
+    """
+    Business Tier: Filtered page of reports/prescriptions as a response dict
+    Returns (response body, status code).
+    """
+    message = validate_date_filters(date_from, date_to)
+    if message:
+        return {"success": False, "message": message}, 400
+    if filters.get("patient_id") is not None and not is_row_id(filters["patient_id"]):
+        return {"success": False, "message": "patient_id is out of range"}, 400
+    try:
+        rows, next_cursor = get_records_page(
+            resource, filters, date_from, date_to, min(max(limit or 50, 1), 500), cursor
+        )
+    except ValueError as e:
+        return {"success": False, "message": str(e)}, 400
+    return {"success": True, "data": rows, "next_cursor": next_cursor}, 200
+
+def read_import_records(stream, import_format):
+    """
+    Business Tier: Yield (row number, record dict) from a CSV or NDJSON text stream
+    CSV needs a header row with the patient column names. Rows that cannot
+    be parsed are yielded as (row number, error message).
+    """
+    if import_format == "csv":
+        reader = csv.DictReader(stream)
+        for row_number, record in enumerate(reader, start=2):
+            yield row_number, record
+        return
+    for row_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield row_number, f"Invalid JSON: {e}"
+            continue
+        yield row_number, record if isinstance(record, dict) else "Each line must be a JSON object"
+
+def import_patients(stream, import_format, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Business Tier: Validate and import patients from a CSV/NDJSON stream
+    Valid rows are written chunk_size at a time; invalid rows are skipped
+    and reported with their row number.
+    """
+    today = datetime.now().strftime("%Y-%m-%d")
+    imported = failed = 0
+    errors = []
+    chunk = []
+
+    records = read_import_records(stream, import_format)
+    while True:
+        try:
+            row_number, record = next(records)
+        except StopIteration:
+            break
+        except (csv.Error, UnicodeDecodeError) as e:
+            # Unreadable file: keep the chunks already committed and stop here
+            if chunk:
+                imported += import_patient_batch(chunk)
+            return {"success": False, "message": f"Invalid file: {e}",
+                    "imported": imported, "failed": failed, "errors": errors}
+
+        if isinstance(record, str):
+            message = record
+        else:
+            record = {key: (value.strip() if isinstance(value, str) else value) for key, value in record.items() if key}
+            # NDJSON values can be numbers, lists or objects: only text (or null
+            # for a missing optional field) may reach the INSERT
+            wrong_type = next((field for field in IMPORT_FIELDS
+                               if record.get(field) is not None and not isinstance(record[field], str)), None)
+            if wrong_type:
+                is_valid, message = False, f"'{wrong_type}' must be text"
+            else:
+                is_valid, message = validate_patient_data(
+                    record.get("first_name"), record.get("last_name"), record.get("dob"), record.get("sex")
+                )
+            if is_valid:
+                chunk.append((
+                    record["first_name"], record["last_name"], record["dob"], record["sex"],
+                    record.get("last_visit") or today, record.get("visit_place") or "Clinic",
+                    record.get("notes") or "",
+                ))
+                if len(chunk) >= chunk_size:
+                    imported += import_patient_batch(chunk)
+                    chunk = []
+                continue
+        failed += 1
+        if len(errors) < IMPORT_MAX_ERRORS:
+            errors.append({"row": row_number, "message": message})
+
+    if chunk:
+        imported += import_patient_batch(chunk)
+    return {"success": True, "imported": imported, "failed": failed, "errors": errors}
+
+import_patients_async = db_executor.wrap(import_patients, write=True)
+
 def process_patient_registration(first_name, last_name, dob, sex, notes):
     """Business Tier: Process patient registration"""
     # Validate data
@@ -323,12 +1233,8 @@ def process_patient_registration(first_name, last_name, dob, sex, notes):
     
     # Save to database
     try:
-        patient_id = add_patient_to_db(first_name, last_name, dob, sex, notes)
-        
-        # Create notification for new patient
-        notification_title = "New Patient Added"
-        notification_message = f"Patient {first_name} {last_name} has been successfully registered (ID: {patient_id})"
-        add_notification(notification_title, notification_message)
+        # Patient and its notification are saved in one transaction
+        patient_id = register_patient_with_notification(first_name, last_name, dob, sex, notes)
         
         return {
             "success": True,
@@ -338,51 +1244,224 @@ def process_patient_registration(first_name, last_name, dob, sex, notes):
     except Exception as e:
         return {"success": False, "message": str(e)}
 
+def encode_export(batches, export_format, compress):
+    """
+    Business Tier: Encode exported rows as NDJSON or CSV, optionally gzip
+    Consumes iter_export_rows() and yields one bytes chunk per batch.
+    Closing this generator closes batches too (its connection goes back
+    to the pool).
+    """
+    try:
+        columns = next(batches)
+        gzip = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+        def emit(text):
+            data = text.encode("utf-8")
+            return gzip.compress(data) if gzip else data
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        if export_format == "csv":
+            writer.writerow(columns)
+        for rows in batches:
+            if export_format == "csv":
+                writer.writerows(rows)
+            else:
+                for row in rows:
+                    buffer.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+                    buffer.write("\n")
+            chunk = emit(buffer.getvalue())
+            buffer.seek(0)
+            buffer.truncate()
+            if chunk:
+                yield chunk
+        tail = emit(buffer.getvalue())
+        if gzip:
+            tail += gzip.flush()
+        if tail:
+            yield tail
+    finally:
+        batches.close()
+
 # ============================================
 # TIER 1: PRESENTATION LAYER (API Endpoints)
 # ============================================
+class ClosingStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse over a blocking generator that is closed however the
+    response ends: finished, failed, or cancelled because the client went
+    away. Without this the generator (and the pooled connection it holds)
+    would only be released when it is garbage-collected.
+    """
+
+    def __init__(self, content, **kwargs):
+        self.source = content
+        super().__init__(content, **kwargs)
+
+    async def stream_response(self, send):
+        try:
+            await super().stream_response(send)
+        finally:
+            # A next() running on a worker thread has finished by now: anyio
+            # waits for the thread even when the stream is cancelled
+            await self.body_iterator.aclose()
+            self.source.close()
+
+def etag_matches(if_none_match, etag):
+    """Presentation Tier: If-None-Match check (weak comparison, as RFC 9110 asks for)"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+
+def conditional_get(request: Request, versions):
+    """
+    Presentation Tier: Caching headers for a GET built from table versions
+    The ETag combines the versions of the tables the endpoint reads with its
+    URL and the caller's role (some responses depend on it). Returns
+    (headers, not_modified): not_modified is a 304 response when the
+    client already holds this version, so the endpoint skips its query.
+
+    Read the versions before running the query: a write in between makes
+    the ETag older than the body, which only costs a later refetch, never a
+    stale 304.
+    """
+    user = request.scope.get("user") or {}
+    key = f"{request.url.path}?{request.url.query}|{user.get('role', '')}".encode("utf-8")
+    etag = '"' + "-".join(str(version) for version, _ in versions) + f"-{zlib.crc32(key):08x}" + '"'
+    # private: the data is per-user sensitive; no-cache: revalidate on every use
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    changed = max((changed_at for _, changed_at in versions if changed_at), default=None)
+    if changed:
+        changed_at = datetime.strptime(changed, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+        headers["Last-Modified"] = format_datetime(changed_at, usegmt=True)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return headers, Response(status_code=304, headers=headers)
+    return headers, None
+
+def page_response(request: Request, name: str, **context):
+    """
+    Presentation Tier: A page from the page cache
+    Sent as the cached gzip copy when the client accepts it (the gzip middleware
+    leaves encoded responses alone), or as 304 when the client's copy is current.
+    """
+    page = page_cache.get(name, **context)
+    use_gzip = choose_encoding(request.headers.get("accept-encoding"), ("gzip",)) == "gzip"
+    etag = page.gzip_etag if use_gzip else page.etag
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+        return HTMLResponse(page.gzip_body, headers=headers)
+    return HTMLResponse(page.body, headers=headers)
+
 @app.get("/", response_class=HTMLResponse)
 def show_login(request: Request):
     """Presentation Tier: Show login page"""
-    return templates.TemplateResponse("login.html", {"request": request})
+    return page_response(request, "login.html")
 
 @app.post("/login")
-def login(username: str = Form(...), password: str = Form(...)):
+async def login(username: str = Form(...), password: str = Form(...)):
     """Presentation Tier: Handle login"""
-    user = verify_user(username, password)
+    user = await authenticate_user(username, password)
+    if user is False:
+        return JSONResponse(
+            {"success": False, "message": "Too many failed attempts, try again later"}, status_code=429
+        )
     if user:
-        return JSONResponse({
+        token = session_manager.issue(user["username"], user["role"], user["id"], user["session_version"])
+        response = JSONResponse({
             "success": True,
             "message": "Login successful",
+            "token": token,
             "user": {
                 "username": user["username"],
                 "role": user["role"]
             }
         })
+        # Cookie for page navigations (/admin/users); API calls send the Bearer token
+        response.set_cookie(SESSION_COOKIE, token, max_age=SESSION_TTL, httponly=True, samesite="strict")
+        return response
     return JSONResponse({"success": False, "message": "Invalid credentials"}, status_code=401)
 
+@app.post("/logout")
+def logout(request: Request):
+    """Presentation Tier: End the user's sessions and clear the session cookie"""
+    user = request.scope.get("user")
+    if user:
+        revoke_sessions(user["id"])
+    response = JSONResponse({"success": True})
+    response.delete_cookie(SESSION_COOKIE)
+    return response
+
 @app.get("/home", response_class=HTMLResponse)
 def show_home(request: Request):
     """Presentation Tier: Show home page"""
-    return templates.TemplateResponse("home.html", {"request": request})
+    return page_response(request, "home.html")
 
 @app.get("/api/patients")
-def get_patients(request: Request):
+def get_patients(
+    request: Request,
+    user: dict = require("patients", "read", "Access denied - No permission to view patients"),
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    sort: str = "id",
+    order: str = "desc",
+):
     """
     Presentation Tier: Get all patients (API endpoint)
     الحصول على قائمة المرضى - يتطلب صلاحية قراءة
+
+    Without query parameters the full list is returned as before.
+    With limit= the result is paginated: pass next_cursor back as cursor=
+    to get the following page. fields= is a comma separated projection.
     """
-    # التحقق من صلاحية القراءة - Check read permission
-    user = request.scope.get("user", {})
-    if not user or not check_permission(user["role"], "patients", "read"):
-        raise HTTPException(status_code=403, detail="Access denied - No permission to view patients")
-    
-    patients = get_all_patients()
-    return JSONResponse({"success": True, "data": patients})
+    headers, not_modified = conditional_get(request, get_table_versions("patients"))
+    if not_modified:
+        return not_modified
+    if limit is None and cursor is None and fields is None and sort == "id" and order == "desc":
+        patients = get_all_patients_json()
+        return JSONResponse({"success": True, "data": patients}, headers=headers)
+
+    page_size = min(max(limit or 50, 1), 500)
+    field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    try:
+        patients, next_cursor = get_patients_page(page_size, cursor, field_list, sort, order)
+    except ValueError as e:
+        return JSONResponse({"success": False, "message": str(e)}, status_code=400)
+    return JSONResponse({
+        "success": True,
+        "data": patients,
+        "next_cursor": next_cursor,
+        "total": count_patients()
+    }, headers=headers)
+
+@app.get("/api/patients/search")
+def search_patients_api(request: Request, user: dict = require("patients", "read", "Access denied - No permission to view patients"), q: str = "", limit: int = 20, offset: int = 0):
+    """
+    Presentation Tier: Search patients by name or notes
+    البحث عن المرضى - يتطلب صلاحية قراءة
+    """
+    headers, not_modified = conditional_get(request, get_table_versions("patients"))
+    if not_modified:
+        return not_modified
+    limit = min(max(limit, 1), 100)
+    offset = max(offset, 0)
+    # Fetch one extra row to know whether another page exists
+    patients = search_patients(q, limit + 1, offset)
+    has_more = len(patients) > limit
+    return JSONResponse({
+        "success": True,
+        "data": patients[:limit],
+        "next_offset": offset + limit if has_more else None
+    }, headers=headers)
 
 @app.post("/api/patients")
 def create_patient(
     request: Request,
+    user: dict = require("patients", "write", "Access denied - No permission to add patients"),
     first_name: str = Form(...),
     last_name: str = Form(...),
     dob: str = Form(...),
@@ -393,63 +1472,181 @@ def create_patient(
     Presentation Tier: Create new patient
     إضافة مريض جديد - يتطلب صلاحية كتابة
     """
-    # التحقق من صلاحية الكتابة - Check write permission
-    user = request.scope.get("user", {})
-    if not user or not check_permission(user["role"], "patients", "write"):
-        raise HTTPException(status_code=403, detail="Access denied - No permission to add patients")
-    
     result = process_patient_registration(first_name, last_name, dob, sex, notes)
     if result["success"]:
         return JSONResponse(result)
     return JSONResponse(result, status_code=400)
 
+@app.post("/api/patients/import")
+async def import_patients_api(
+    request: Request,
+    user: dict = require("patients", "write", "Access denied - No permission to add patients"),
+    file: UploadFile = File(...),
+    format: Optional[str] = Form(None),
+):
+    """
+    Presentation Tier: Import many patients from a CSV or NDJSON file
+    استيراد المرضى من ملف - يتطلب صلاحية كتابة
+
+    The format is taken from format= or the file extension (.csv, .ndjson,
+    .jsonl). The response lists the rows that were rejected and why.
+    """
+    import_format = format or ("csv" if (file.filename or "").lower().endswith(".csv") else "ndjson")
+    if import_format not in ("csv", "ndjson"):
+        return JSONResponse({"success": False, "message": "format must be csv or ndjson"}, status_code=400)
+
+    stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    try:
+        result = await import_patients_async(stream, import_format)
+    finally:
+        stream.detach()
+    return JSONResponse(result, status_code=200 if result["success"] else 400)
+
+@app.get("/api/stats")
+def get_stats(request: Request, user: dict = require("patients", "read", "Access denied - No permission to view statistics"), days: int = 30):
+    """
+    Presentation Tier: Dashboard statistics
+    إحصائيات لوحة التحكم - يتطلب صلاحية قراءة المرضى
+    """
+    stats = get_dashboard_statistics(min(max(days, 1), 366))
+    return JSONResponse({"success": True, "data": stats})
+
 @app.get("/api/notifications")
-def get_notifications():
-    """Presentation Tier: Get all notifications"""
-    notifications = get_all_notifications()
+def get_notifications(request: Request, since_id: Optional[int] = None, limit: int = 20):
+    """
+    Presentation Tier: Get the latest notifications
+    With since_id: the notifications newer than since_id, oldest first, and
+    has_more when the client should ask again from the last id returned.
+    """
+    if since_id is not None and not is_row_id(since_id):
+        return JSONResponse({"success": False, "message": "since_id is out of range"}, status_code=400)
+    headers, not_modified = conditional_get(request, get_table_versions("notifications"))
+    if not_modified:
+        return not_modified
+    limit = min(max(limit, 1), 100)
     unread_count = get_unread_notifications_count()
+    if since_id is None:
+        return JSONResponse({
+            "success": True, 
+            "data": get_all_notifications(limit=limit),
+            "unread_count": unread_count
+        }, headers=headers)
+    # Fetch one extra row to know whether another page exists
+    notifications = get_all_notifications(since_id, limit + 1)
     return JSONResponse({
-        "success": True, 
-        "data": notifications,
+        "success": True,
+        "data": notifications[:limit],
+        "has_more": len(notifications) > limit,
         "unread_count": unread_count
-    })
+    }, headers=headers)
+
+@app.get("/api/notifications/stream")
+async def stream_notifications(request: Request):
+    """
+    Presentation Tier: Stream new notifications as Server-Sent Events
+    بث الإشعارات الجديدة فور إنشائها بدلاً من إعادة تحميل القائمة
+    """
+    async def event_stream():
+        subscription = notification_broker.subscribe()
+        try:
+            # Current unread count first, then only changes
+            unread_count = await get_unread_notifications_count_async()
+            yield f"event: unread\ndata: {json.dumps({'unread_count': unread_count})}\n\n"
+            while True:
+                event = await subscription.get(timeout=15)
+                if event is DROPPED:
+                    break
+                if event is None:
+                    # Keep-alive comment so proxies do not close an idle stream
+                    yield ": ping\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            notification_broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/notifications/read")
+def mark_notifications_read(up_to_id: int = Form(...)):
+    """Presentation Tier: Mark all notifications up to an id as read in one request"""
+    if not is_row_id(up_to_id):
+        return JSONResponse({"success": False, "message": "up_to_id is out of range"}, status_code=400)
+    updated = mark_notifications_read_up_to(up_to_id)
+    return JSONResponse({"success": True, "updated": updated})
 
 @app.post("/api/notifications/{notification_id}/read")
 def mark_notification_read(notification_id: int):
     """Presentation Tier: Mark notification as read"""
+    if not is_row_id(notification_id):
+        return JSONResponse({"success": False, "message": "notification_id is out of range"}, status_code=400)
     result = mark_notification_as_read(notification_id)
     return JSONResponse({"success": result})
 
 @app.get("/api/patients/{patient_id}")
-def get_patient(patient_id: int, request: Request):
+def get_patient(patient_id: int, request: Request, user: dict = require("patients", "read", "Access denied - No permission to view patient details")):
     """
     Presentation Tier: Get patient by ID
     الحصول على بيانات مريض محدد - يتطلب صلاحية قراءة
     """
-    # التحقق من صلاحية القراءة - Check read permission
-    user = request.scope.get("user", {})
-    if not user or not check_permission(user["role"], "patients", "read"):
-        raise HTTPException(status_code=403, detail="Access denied - No permission to view patient details")
-    
+    headers, not_modified = conditional_get(request, get_table_versions("patients"))
+    if not_modified:
+        return not_modified
     patient = get_patient_by_id(patient_id)
     if patient:
-        return JSONResponse({"success": True, "data": patient})
+        return JSONResponse({"success": True, "data": patient}, headers=headers)
     return JSONResponse({"success": False, "message": "Patient not found"}, status_code=404)
 
+@app.get("/api/patients/{patient_id}/timeline")
+def get_patient_timeline_api(
+    patient_id: int,
+    request: Request,
+    user: dict = require("patients", "read", "Access denied - No permission to view patient details"),
+    limit: int = 50,
+    cursor: Optional[str] = None,
+):
+    """
+    Presentation Tier: A patient with their reports and prescriptions, newest first
+    الملف الزمني للمريض - التقارير والوصفات حسب صلاحيات الدور
+
+    Only the entry types the role may read are included. Pass next_cursor
+    back as cursor= for the next page.
+    """
+    headers, not_modified = conditional_get(request, get_table_versions("patients", "reports", "prescriptions"))
+    if not_modified:
+        return not_modified
+    patient = get_patient_by_id(patient_id)
+    if not patient:
+        return JSONResponse({"success": False, "message": "Patient not found"}, status_code=404)
+
+    entry_types = [
+        entry_type for entry_type, (_, resource, _) in TIMELINE_SOURCES.items()
+        if check_permission(user["role"], resource, "read")
+    ]
+    try:
+        entries, next_cursor = get_patient_timeline(patient_id, entry_types, min(max(limit, 1), 200), cursor)
+    except ValueError as e:
+        return JSONResponse({"success": False, "message": str(e)}, status_code=400)
+    return JSONResponse({
+        "success": True,
+        "data": {"patient": patient, "timeline": entries},
+        "included": entry_types,
+        "next_cursor": next_cursor,
+    }, headers=headers)
+
 @app.put("/api/patients/{patient_id}")
 async def update_patient(
     patient_id: int,
     request: Request,
+    user: dict = require("patients", "update", "Access denied - No permission to update patients"),
 ):
     """
     Presentation Tier: Update patient
     تحديث بيانات مريض - يتطلب صلاحية تحديث
     """
-    # التحقق من صلاحية التحديث - Check update permission
-    user = request.scope.get("user", {})
-    if not user or not check_permission(user["role"], "patients", "update"):
-        raise HTTPException(status_code=403, detail="Access denied - No permission to update patients")
-    
     form = await request.form()
     first_name = form.get("first_name")
     last_name = form.get("last_name")
@@ -464,58 +1661,62 @@ async def update_patient(
     
     # Update
     try:
-        update_patient_in_db(patient_id, first_name, last_name, dob, sex, notes)
-        add_notification("Patient Updated", f"Patient {first_name} {last_name} (ID: {patient_id}) has been updated")
+        await update_patient_with_notification_async(patient_id, first_name, last_name, dob, sex, notes)
         return JSONResponse({"success": True, "message": "Patient updated successfully"})
     except Exception as e:
         return JSONResponse({"success": False, "message": str(e)}, status_code=400)
 
 @app.delete("/api/patients/{patient_id}")
-def delete_patient(patient_id: int, request: Request):
+def delete_patient(patient_id: int, request: Request, user: dict = require("patients", "delete", "Access denied - No permission to delete patients")):
     """
     Presentation Tier: Delete patient
     حذف مريض - يتطلب صلاحية حذف
     """
-    # التحقق من صلاحية الحذف - Check delete permission
-    user = request.scope.get("user", {})
-    if not user or not check_permission(user["role"], "patients", "delete"):
-        raise HTTPException(status_code=403, detail="Access denied - No permission to delete patients")
-    
     try:
-        patient = get_patient_by_id(patient_id)
+        patient = delete_patient_with_notification(patient_id)
         if patient:
-            delete_patient_from_db(patient_id)
-            add_notification("Patient Deleted", f"Patient {patient['first_name']} {patient['last_name']} (ID: {patient_id}) has been deleted")
             return JSONResponse({"success": True, "message": "Patient deleted successfully"})
         return JSONResponse({"success": False, "message": "Patient not found"}, status_code=404)
     except Exception as e:
         return JSONResponse({"success": False, "message": str(e)}, status_code=400)
 
 @app.get("/api/reports")
-def get_reports(request: Request):
+def get_reports(
+    request: Request,
+    user: dict = require("reports", "read", "Access denied - No permission to view reports"),
+    patient_id: Optional[int] = None,
+    created_by: Optional[str] = None,
+    report_type: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+):
     """
     Presentation Tier: Get all reports
     الحصول على قائمة التقارير - يتطلب صلاحية قراءة
+
+    Without query parameters the full list is returned as before. Any filter,
+    limit= or cursor= returns one page (newest first) with next_cursor.
     """
-    # التحقق من صلاحية القراءة - Check read permission
-    user = request.scope.get("user", {})
-    if not user or not check_permission(user["role"], "reports", "read"):
-        raise HTTPException(status_code=403, detail="Access denied - No permission to view reports")
-    
-    reports = get_all_reports()
-    return JSONResponse({"success": True, "data": reports})
+    # Both lists show the patient's name, so patient changes count too
+    headers, not_modified = conditional_get(request, get_table_versions("reports", "patients"))
+    if not_modified:
+        return not_modified
+    filters = {"patient_id": patient_id, "created_by": created_by, "report_type": report_type}
+    if all(value is None for value in (patient_id, created_by, report_type, date_from, date_to, limit, cursor)):
+        reports = get_all_reports_json()
+        return JSONResponse({"success": True, "data": reports}, headers=headers)
+
+    body, status_code = list_records("reports", filters, date_from, date_to, limit, cursor)
+    return JSONResponse(body, status_code=status_code, headers=headers if status_code == 200 else None)
 
 @app.post("/api/reports")
-async def create_report(request: Request):
+async def create_report(request: Request, user: dict = require("reports", "write", "Access denied - Only doctors can create reports")):
     """
     Presentation Tier: Create new report
     إنشاء تقرير طبي جديد - يتطلب صلاحية كتابة
     """
-    # التحقق من صلاحية الكتابة - Check write permission
-    user = request.scope.get("user", {})
-    if not user or not check_permission(user["role"], "reports", "write"):
-        raise HTTPException(status_code=403, detail="Access denied - Only doctors can create reports")
-    
     form = await request.form()
     patient_id = form.get("patient_id")
     report_type = form.get("report_type")
@@ -526,9 +1727,7 @@ async def create_report(request: Request):
     created_by = form.get("created_by", "")
     
     try:
-        report_id = add_report_to_db(patient_id, report_type, diagnosis, treatment, medications, notes, created_by)
-        patient = get_patient_by_id(int(patient_id))
-        add_notification("New Report Created", f"New {report_type} report created for patient {patient['first_name']} {patient['last_name']}")
+        report_id = await add_report_with_notification_async(int(patient_id), report_type, diagnosis, treatment, medications, notes, created_by)
         return JSONResponse({"success": True, "message": "Report created successfully", "report_id": report_id})
     except Exception as e:
         return JSONResponse({"success": False, "message": str(e)}, status_code=400)
@@ -549,62 +1748,117 @@ async def admin_users_page(request: Request):
         return RedirectResponse(url="/login", status_code=303)
     
     # Return the admin users page without pre-loading users
-    return templates.TemplateResponse("admin_users.html", {"request": request, "current_user": user})
+    # (only the role is passed: it is part of the page cache key, the username is not)
+    return page_response(request, "admin_users.html", current_user={"role": user["role"]})
 
 @app.get("/api/admin/users")
-async def get_users_api(request: Request):
-    """API to get all users"""
-    # Get user from request scope (set by middleware)
-    user = request.scope.get("user", {})
-    
-    # Check if user is admin
-    if not user or user.get("role") != "Admin":
-        raise HTTPException(status_code=403, detail="Access denied - Admin only")
-    
-    # Get all users except admin
-    all_users = get_all_users()
-    users = [u for u in all_users if u["role"] != "Admin"]
-    return JSONResponse({"success": True, "data": users})
+async def get_users_api(
+    request: Request,
+    user: dict = require("users", "read", "Access denied - Admin only"),
+    role: Optional[str] = None,
+    q: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+):
+    """
+    API to get users (admins are never listed)
+    role= filters by role, q= matches the start of the username. Without
+    limit= every matching user is returned; with it, one page and next_cursor.
+    """
+    if role is not None and role not in USER_ROLES:
+        return JSONResponse({"success": False, "message": "Invalid role"}, status_code=400)
+    headers, not_modified = conditional_get(request, await get_table_versions_async("users"))
+    if not_modified:
+        return not_modified
+    try:
+        users, next_cursor = await get_users_page_async(
+            role, q, min(max(limit, 1), 500) if limit else None, cursor
+        )
+    except ValueError as e:
+        return JSONResponse({"success": False, "message": str(e)}, status_code=400)
+    return JSONResponse({"success": True, "data": users, "next_cursor": next_cursor}, headers=headers)
 
 @app.post("/api/admin/users")
-async def add_user_api(request: Request, 
+async def add_user_api(request: Request, user: dict = require("users", "write", "Access denied - Admin only"), 
                       username: str = Form(...), 
                       password: str = Form(...), 
                       role: str = Form(...)):
     """API to add new user"""
-    # Get user from request scope (set by middleware)
-    user = request.scope.get("user", {})
-    
-    # Check if user is admin
-    if not user or user.get("role") != "Admin":
-        raise HTTPException(status_code=403, detail="Access denied - Admin only")
-    
     # Validate role
-    valid_roles = ["Doctor", "Nurse", "Pharmacist"]
-    if role not in valid_roles:
+    if role not in USER_ROLES:
         return JSONResponse({"success": False, "message": "Invalid role"}, status_code=400)
     
-    # Check if username already exists
-    existing_users = get_all_users()
-    if any(u["username"] == username for u in existing_users):
-        return JSONResponse({"success": False, "message": "Username already exists"}, status_code=400)
-    
+    # A taken username is rejected by the UNIQUE constraint on users.username
     try:
-        user_id = add_user_to_db(username, password, role)
+        user_id = await add_user_to_db_async(username, await password_hasher.hash(password), role)
         return JSONResponse({"success": True, "message": "User added successfully", "user_id": user_id})
     except Exception as e:
         return JSONResponse({"success": False, "message": str(e)}, status_code=400)
 
+async def read_bulk_items(request: Request, key: str):
+    """Presentation Tier: The list under key in a JSON body, or an error response"""
+    try:
+        body = await request.json()
+    except ValueError:
+        return None, JSONResponse({"success": False, "message": "Expected a JSON body"}, status_code=400)
+    items = body.get(key) if isinstance(body, dict) else None
+    if not isinstance(items, list) or not items:
+        return None, JSONResponse({"success": False, "message": f"'{key}' must be a non-empty list"}, status_code=400)
+    if len(items) > ADMIN_BULK_MAX:
+        return None, JSONResponse(
+            {"success": False, "message": f"At most {ADMIN_BULK_MAX} {key} per request"}, status_code=400
+        )
+    return items, None
+
+@app.post("/api/admin/users/bulk")
+async def add_users_bulk_api(request: Request, user: dict = require("users", "write", "Access denied - Admin only")):
+    """
+    API to add many users at once
+    Body: {"users": [{"username": ..., "password": ..., "role": ...}, ...]}
+    """
+    entries, error = await read_bulk_items(request, "users")
+    if error:
+        return error
+    return JSONResponse(await create_users(entries))
+
+@app.put("/api/admin/users/bulk")
+async def update_users_bulk_api(request: Request, user: dict = require("users", "update", "Access denied - Admin only")):
+    """
+    API to change the role of many users at once
+    Body: {"changes": [{"id": ..., "role": ...}, ...]}
+    """
+    changes, error = await read_bulk_items(request, "changes")
+    if error:
+        return error
+    valid, failed = [], []
+    for change in changes:
+        change = change if isinstance(change, dict) else {}
+        if not is_row_id(change.get("id")):
+            failed.append({"id": failed_id(change.get("id")), "message": "User id must be an integer"})
+        elif change.get("role") not in USER_ROLES:
+            failed.append({"id": change["id"], "message": "Invalid role"})
+        else:
+            valid.append((change["id"], change["role"]))
+    updated, refused = await update_user_roles_in_db_async(valid) if valid else ([], [])
+    return JSONResponse({"success": True, "updated": updated, "failed": failed + refused})
+
+@app.delete("/api/admin/users/bulk")
+async def delete_users_bulk_api(request: Request, user: dict = require("users", "delete", "Access denied - Admin only")):
+    """
+    API to delete many users at once
+    Body: {"ids": [...]}
+    """
+    user_ids, error = await read_bulk_items(request, "ids")
+    if error:
+        return error
+    valid = [user_id for user_id in user_ids if is_row_id(user_id)]
+    failed = [{"id": failed_id(user_id), "message": "User id must be an integer"} for user_id in user_ids if not is_row_id(user_id)]
+    deleted, refused = await delete_users_from_db_async(valid) if valid else ([], [])
+    return JSONResponse({"success": True, "deleted": deleted, "failed": failed + refused})
+
 @app.put("/api/admin/users/{user_id}")
-async def update_user_api(user_id: int, request: Request, role: str = None):
+async def update_user_api(user_id: int, request: Request, user: dict = require("users", "update", "Access denied - Admin only"), role: str = None):
     """API to update user role"""
-    # Get user from request scope (set by middleware)
-    user = request.scope.get("user", {})
-    
-    # Check if user is admin
-    if not user or user.get("role") != "Admin":
-        raise HTTPException(status_code=403, detail="Access denied - Admin only")
-    
     # Get role from form data or JSON body
     if role is None:
         # Try to get role from JSON body
@@ -617,90 +1871,142 @@ async def update_user_api(user_id: int, request: Request, role: str = None):
             role = form.get("role")
     
     # Validate role
-    valid_roles = ["Doctor", "Nurse", "Pharmacist"]
-    if role not in valid_roles:
+    if role not in USER_ROLES:
         return JSONResponse({"success": False, "message": "Invalid role"}, status_code=400)
     
-    # Get the user to update
-    target_user = None
-    all_users = get_all_users()
-    for u in all_users:
-        if u["id"] == user_id:
-            target_user = u
-            break
-    
-    if not target_user:
-        return JSONResponse({"success": False, "message": "User not found"}, status_code=404)
-    
-    # Prevent changing admin user
-    if target_user["role"] == "Admin":
-        return JSONResponse({"success": False, "message": "Cannot modify admin user"}, status_code=400)
-    
     try:
-        # Update user role in database
-        conn = get_db_connection()
-        conn.execute("UPDATE users SET role = ? WHERE id = ?", (role, user_id))
-        conn.commit()
-        conn.close()
-        return JSONResponse({"success": True, "message": "User updated successfully"})
+        # Single guarded UPDATE by primary key; admins are refused
+        _, failed = await update_user_roles_in_db_async([(user_id, role)])
     except Exception as e:
         return JSONResponse({"success": False, "message": str(e)}, status_code=400)
+    if failed:
+        message = failed[0]["message"]
+        return JSONResponse({"success": False, "message": message},
+                            status_code=404 if message == "User not found" else 400)
+    return JSONResponse({"success": True, "message": "User updated successfully"})
 
 @app.delete("/api/admin/users/{user_id}")
-async def delete_user_api(user_id: int, request: Request):
+async def delete_user_api(user_id: int, request: Request, user: dict = require("users", "delete", "Access denied - Admin only")):
     """API to delete user"""
-    # Get user from request scope (set by middleware)
-    user = request.scope.get("user", {})
-    
-    # Check if user is admin
-    if not user or user.get("role") != "Admin":
-        raise HTTPException(status_code=403, detail="Access denied - Admin only")
-    
-    # Prevent deletion of admin user
-    target_user = None
-    all_users = get_all_users()
-    for u in all_users:
-        if u["id"] == user_id:
-            target_user = u
-            break
-    
-    if not target_user:
-        return JSONResponse({"success": False, "message": "User not found"}, status_code=404)
-    
-    if target_user["role"] == "Admin":
-        return JSONResponse({"success": False, "message": "Cannot delete admin user"}, status_code=400)
-    
     try:
-        delete_user_from_db(user_id)
-        return JSONResponse({"success": True, "message": "User deleted successfully"})
+        # Single guarded DELETE by primary key; admins are refused
+        _, failed = await delete_users_from_db_async([user_id])
     except Exception as e:
         return JSONResponse({"success": False, "message": str(e)}, status_code=400)
+    if failed:
+        message = failed[0]["message"]
+        return JSONResponse({"success": False, "message": message},
+                            status_code=404 if message == "User not found" else 400)
+    return JSONResponse({"success": True, "message": "User deleted successfully"})
+
+@app.get("/api/admin/cache")
+async def cache_stats_api(request: Request, user: dict = require("users", "read", "Access denied - Admin only")):
+    """API to see patient and page cache hit/miss counters"""
+    return JSONResponse({"success": True, "data": {"patients": patient_cache.stats(), "pages": page_cache.stats()}})
+
+@app.get("/api/admin/slow-queries")
+async def slow_queries_api(request: Request, user: dict = require("users", "read", "Access denied - Admin only")):
+    """API to see the latest slow SQL statements with their query plans"""
+    return JSONResponse({"success": True, "data": slow_query_log.recent()})
+
+def has_metrics_token(request: Request) -> bool:
+    """Presentation Tier: Does the request carry METRICS_TOKEN as its bearer token?"""
+    if METRICS_TOKEN is None:
+        return False
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(token.strip().encode("utf-8"), METRICS_TOKEN.encode("utf-8"))
+
+@app.get("/metrics")
+async def metrics(request: Request):
+    """
+    Presentation Tier: Prometheus metrics (text exposition format)
+    مقاييس الأداء لكل مسار - latency, DB time, queries, rows and response size per route
+    Admin only (same permission as the other admin APIs), or METRICS_TOKEN for scrapers.
+    """
+    user = request.scope.get("user")
+    if not has_metrics_token(request):
+        if user is None:
+            raise HTTPException(status_code=401, detail="Unauthorized - Missing user credentials")
+        if not check_permission(user["role"], "users", "read"):
+            raise HTTPException(status_code=403, detail="Access denied - Admin only")
+    return Response(metrics_registry.render(), media_type=MetricsRegistry.CONTENT_TYPE)
 
 @app.get("/api/prescriptions")
-def get_prescriptions(request: Request):
+def get_prescriptions(
+    request: Request,
+    user: dict = require("prescriptions", "read", "Access denied - No permission to view prescriptions"),
+    patient_id: Optional[int] = None,
+    prescribed_by: Optional[str] = None,
+    medication_name: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+):
     """
     Presentation Tier: Get all prescriptions
     الحصول على قائمة الوصفات الطبية - يتطلب صلاحية قراءة
+
+    Without query parameters the full list is returned as before. Any filter,
+    limit= or cursor= returns one page (newest first) with next_cursor.
     """
-    # التحقق من صلاحية القراءة - Check read permission
-    user = request.scope.get("user", {})
-    if not user or not check_permission(user["role"], "prescriptions", "read"):
-        raise HTTPException(status_code=403, detail="Access denied - No permission to view prescriptions")
-    
-    prescriptions = get_all_prescriptions()
-    return JSONResponse({"success": True, "data": prescriptions})
+    # Both lists show the patient's name, so patient changes count too
+    headers, not_modified = conditional_get(request, get_table_versions("prescriptions", "patients"))
+    if not_modified:
+        return not_modified
+    filters = {"patient_id": patient_id, "prescribed_by": prescribed_by, "medication_name": medication_name}
+    if all(value is None for value in (patient_id, prescribed_by, medication_name, date_from, date_to, limit, cursor)):
+        prescriptions = get_all_prescriptions_json()
+        return JSONResponse({"success": True, "data": prescriptions}, headers=headers)
+
+    body, status_code = list_records("prescriptions", filters, date_from, date_to, limit, cursor)
+    return JSONResponse(body, status_code=status_code, headers=headers if status_code == 200 else None)
+
+@app.get("/api/export/{resource}")
+def export_resource(
+    resource: str,
+    request: Request,
+    user: dict = Depends(get_current_user),
+    format: str = "ndjson",
+    gzip: bool = False,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+):
+    """
+    Presentation Tier: Download a whole table as NDJSON or CSV
+    تصدير البيانات - يتطلب صلاحية قراءة على المورد المطلوب
+
+    Rows are streamed as they are read. date_from/date_to (YYYY-MM-DD) filter
+    patients by last visit and reports/prescriptions by creation date.
+    gzip=true returns a .gz file.
+    """
+    if resource not in EXPORT_QUERIES:
+        raise HTTPException(status_code=404, detail="Unknown export resource")
+    if not check_permission(user["role"], resource, "read"):
+        raise HTTPException(status_code=403, detail=f"Access denied - No permission to export {resource}")
+    if format not in ("ndjson", "csv"):
+        return JSONResponse({"success": False, "message": "format must be ndjson or csv"}, status_code=400)
+    message = validate_date_filters(date_from, date_to)
+    if message:
+        return JSONResponse({"success": False, "message": message}, status_code=400)
+
+    filename = f"{resource}.{format}" + (".gz" if gzip else "")
+    if gzip:
+        media_type = "application/gzip"
+    else:
+        media_type = "text/csv; charset=utf-8" if format == "csv" else "application/x-ndjson"
+    return ClosingStreamingResponse(
+        encode_export(iter_export_rows(resource, date_from, date_to), format, gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 @app.post("/api/prescriptions")
-async def create_prescription(request: Request):
+async def create_prescription(request: Request, user: dict = require("prescriptions", "write", "Access denied - Only doctors can create prescriptions")):
     """
     Presentation Tier: Create new prescription
     إضافة وصفة طبية جديدة - يتطلب صلاحية كتابة (للأطباء فقط)
     """
-    # التحقق من صلاحية الكتابة - Check write permission
-    user = request.scope.get("user", {})
-    if not user or not check_permission(user["role"], "prescriptions", "write"):
-        raise HTTPException(status_code=403, detail="Access denied - Only doctors can create prescriptions")
-    
     form = await request.form()
     patient_id = form.get("patient_id")
     medication_name = form.get("medication_name")
@@ -711,9 +2017,7 @@ async def create_prescription(request: Request):
     prescribed_by = form.get("prescribed_by", "")
     
     try:
-        prescription_id = add_prescription_to_db(patient_id, medication_name, dosage, frequency, duration, instructions, prescribed_by)
-        patient = get_patient_by_id(int(patient_id))
-        add_notification("New Prescription Added", f"New prescription for {medication_name} added for patient {patient['first_name']} {patient['last_name']}")
+        prescription_id = await add_prescription_with_notification_async(int(patient_id), medication_name, dosage, frequency, duration, instructions, prescribed_by)
         return JSONResponse({"success": True, "message": "Prescription added successfully", "prescription_id": prescription_id})
     except Exception as e:
         return JSONResponse({"success": False, "message": str(e)}, status_code=400)
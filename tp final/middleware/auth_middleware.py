@@ -1,58 +1,67 @@
-from fastapi import Request, HTTPException, Header
-from typing import Optional
+from fastapi import Request, HTTPException
 import json
 
-def get_current_user(x_user_role: Optional[str] = Header(None), 
-                     x_user_name: Optional[str] = Header(None)) -> dict:
-    if not x_user_role or not x_user_name:
+SESSION_COOKIE = "session"
+
+
+def get_current_user(request: Request) -> dict:
+    """المستخدم الذي تحقق منه الوسيط - User verified by AuthMiddleware"""
+    user = request.scope.get("user")
+    if not user:
         raise HTTPException(status_code=401, detail="Unauthorized - No user credentials")
-    
-    return {"role": x_user_role, "username": x_user_name}
+
+    return user
 class AuthMiddleware:
-    
-    def __init__(self, app):
+    """
+    Authenticates requests with the signed session token issued by /login,
+    sent as "Authorization: Bearer <token>" or in the session cookie (page
+    navigations such as /admin/users). The verified user is stored in
+    scope["user"].
+    """
+
+    def __init__(self, app, sessions):
         self.app = app
+        self.sessions = sessions
 
     async def __call__(self, scope, receive, send):
-        if scope["type"] != "http":
+        if scope["type"] != "http" or scope["path"].startswith("/static"):
             await self.app(scope, receive, send)
             return
-            
-        headers = dict(scope.get("headers", []))
-        
-        user_role = b""
-        user_name = b""
-        
-        for key, value in headers.items():
-            if key.lower() == b"x-user-role":
-                user_role = value
-            elif key.lower() == b"x-user-name":
-                user_name = value
-        
-        user_role = user_role.decode("utf-8")
-        user_name = user_name.decode("utf-8")
-        
-        if user_role and user_name:
-            scope["user"] = {
-                "role": user_role,
-                "username": user_name
-            }
-        
+
+        token = self._find_token(scope["headers"])
+        user = await self.sessions.verify(token) if token else None
+        if user is not None:
+            scope["user"] = user
+
         if scope["path"] in ["/", "/login"] or not scope["path"].startswith("/api"):
             await self.app(scope, receive, send)
             return
-            
-        try:
-            if not user_role or not user_name:
-                await self._send_error_response(send, 401, "Unauthorized - Missing user credentials")
-                return
-            
-        except Exception as e:
-            await self._send_error_response(send, 401, f"Authentication error: {str(e)}")
+
+        if user is None:
+            detail = "Unauthorized - Invalid or expired session" if token else "Unauthorized - Missing user credentials"
+            await self._send_error_response(send, 401, detail)
             return
-            
+
         await self.app(scope, receive, send)
-    
+
+    @staticmethod
+    def _find_token(headers):
+        """Single pass over the raw headers (ASGI header names are already lower-case)"""
+        cookie = None
+        for key, value in headers:
+            if key == b"authorization":
+                if value[:7].lower() == b"bearer ":
+                    return value[7:].strip().decode("latin-1")
+            elif key == b"cookie":
+                cookie = value
+        if cookie is None:
+            return None
+        for part in cookie.decode("latin-1").split(";"):
+            name, _, value = part.strip().partition("=")
+            if name == SESSION_COOKIE:
+                return value or None
+        return None
+
     async def _send_error_response(self, send, status_code: int, detail: str):
         """إرسال رسالة خطأ"""
         await send({
@@ -63,4 +72,4 @@ class AuthMiddleware:
         await send({
             "type": "http.response.body",
             "body": json.dumps({"detail": detail}).encode("utf-8"),
-        })
\ No newline at end of file
+        })
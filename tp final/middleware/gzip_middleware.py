@@ -0,0 +1,27 @@
+from starlette.middleware.gzip import GZipMiddleware, IdentityResponder
+
+from assets.encoding import choose_encoding
+
+
+class NegotiatingGZipMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware that reads the q-values of Accept-Encoding: Starlette's
+    only looks for "gzip" in the header, so "gzip;q=0" (gzip refused) still
+    got a gzipped body. Requests that refuse gzip are passed through
+    uncompressed; the rest are handled by GZipMiddleware as before.
+    """
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            header = None
+            for key, value in scope["headers"]:
+                if key == b"accept-encoding":
+                    header = value.decode("latin-1")
+                    break
+            if choose_encoding(header, ("gzip",)) is None:
+                responder = IdentityResponder(
+                    self.app, self.minimum_size, exclude_content_types=self.exclude_content_types
+                )
+                await responder(scope, receive, send)
+                return
+        await super().__call__(scope, receive, send)
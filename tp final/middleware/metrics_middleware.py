@@ -0,0 +1,44 @@
+import time
+
+from monitoring.metrics import start_request, end_request
+
+
+class MetricsMiddleware:
+    """
+    Records every request in a MetricsRegistry: latency, status, response
+    bytes and the database work done for it (RequestMetrics). Requests are
+    labelled with the matched route template (/api/patients/{patient_id}),
+    so ids never create new series; requests answered before routing (401
+    from AuthMiddleware, 404) are labelled "unmatched".
+    """
+
+    def __init__(self, app, registry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_metrics, token = start_request()
+        status = 500
+        response_bytes = 0
+
+        async def send_and_measure(message):
+            nonlocal status, response_bytes
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_and_measure)
+        finally:
+            elapsed = time.perf_counter() - start
+            end_request(token)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            self.registry.observe_request(scope["method"], route, str(status), elapsed,
+                                          response_bytes, request_metrics)
@@ -0,0 +1,190 @@
+"""
+مقاييس الأداء - Request and database metrics
+
+Histograms in the Prometheus text exposition format (no client library
+needed). RequestMetrics collects what a single request cost while it runs:
+MetricsMiddleware starts one per request and stores it in a context
+variable, and the database instrumentation adds each statement's time,
+rows and the connections borrowed to it. The context variable follows the
+request onto worker threads (DatabaseExecutor, run_in_threadpool and the
+write queue copy the context).
+"""
+import contextvars
+import threading
+
+# Upper bounds, Prometheus' default latency buckets plus a 1 ms bucket for DB time
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+ROWS_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+BYTES_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+_current = contextvars.ContextVar("request_metrics", default=None)
+
+
+class RequestMetrics:
+    """What one request spent in the database"""
+
+    __slots__ = ("db_time", "queries", "rows", "connections")
+
+    def __init__(self):
+        self.db_time = 0.0
+        self.queries = 0
+        self.rows = 0
+        self.connections = 0
+
+
+def current_request():
+    """RequestMetrics of the request being served, or None outside a request"""
+    return _current.get()
+
+
+def start_request():
+    """Begin collecting for a new request; returns (metrics, token for end_request)"""
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def record_connection():
+    """Count a connection borrowed from the pool by the current request"""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.connections += 1
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Histogram:
+    """Cumulative-bucket histogram, one series per label combination"""
+
+    def __init__(self, name, help_text, buckets, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.label_names = tuple(label_names)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = sorted((labels, list(series)) for labels, series in self._series.items())
+        for labels, series in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                label_text = _format_labels(self.label_names, labels, f'le="{_format_value(float(bound))}"')
+                lines.append(f"{self.name}_bucket{label_text} {cumulative}")
+            label_text = _format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter, one series per label combination"""
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = sorted(self._values.items())
+        for labels, value in snapshot:
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """The application's metrics and their rendering for GET /metrics"""
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self, prefix="app"):
+        route = ("method", "route")
+        self.requests = Counter(f"{prefix}_http_requests_total", "Requests served", route + ("status",))
+        self.latency = Histogram(f"{prefix}_http_request_duration_seconds", "Total request latency",
+                                 SECONDS_BUCKETS, route)
+        self.db_time = Histogram(f"{prefix}_http_request_db_seconds", "Time spent in SQLite statements per request",
+                                 SECONDS_BUCKETS, route)
+        self.queries = Histogram(f"{prefix}_http_request_db_queries", "SQL statements executed per request",
+                                 COUNT_BUCKETS, route)
+        self.connections = Histogram(f"{prefix}_http_request_db_connections", "Pooled connections borrowed per request",
+                                     COUNT_BUCKETS, route)
+        self.rows = Histogram(f"{prefix}_http_request_db_rows", "Rows fetched from SQLite per request",
+                              ROWS_BUCKETS, route)
+        self.response_bytes = Histogram(f"{prefix}_http_response_bytes", "Response body size",
+                                        BYTES_BUCKETS, route)
+        self.commit_time = Histogram(f"{prefix}_db_commit_seconds", "Write queue group commit duration",
+                                     SECONDS_BUCKETS)
+        self.commit_batch = Histogram(f"{prefix}_db_commit_batch_size", "Mutations per group commit",
+                                      COUNT_BUCKETS)
+        self.slow_queries = Counter(f"{prefix}_db_slow_queries_total", "Statements slower than the slow-query threshold")
+        self._metrics = [
+            self.requests, self.latency, self.db_time, self.queries, self.connections,
+            self.rows, self.response_bytes, self.commit_time, self.commit_batch, self.slow_queries,
+        ]
+
+    def observe_request(self, method, route, status, seconds, response_bytes, request):
+        labels = (method, route)
+        self.requests.inc(labels + (status,))
+        self.latency.observe(seconds, labels)
+        self.db_time.observe(request.db_time, labels)
+        self.queries.observe(request.queries, labels)
+        self.connections.observe(request.connections, labels)
+        self.rows.observe(request.rows, labels)
+        self.response_bytes.observe(response_bytes, labels)
+
+    def observe_commit(self, batch_size, seconds):
+        """Write queue callback, called on the writer thread after each COMMIT"""
+        self.commit_time.observe(seconds)
+        self.commit_batch.observe(batch_size)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,78 @@
+"""
+وسيط الإشعارات الفورية - In-process notification broker
+
+Write paths publish events (new notification, notification read, ...) and
+every connected dashboard receives them through its own bounded queue.
+publish() is thread-safe, so it can be called from the sync endpoints that
+FastAPI runs in its threadpool. A client that stops reading and lets its
+queue fill up is disconnected instead of slowing everyone else down.
+"""
+import asyncio
+import threading
+
+# Marker pushed to a subscriber that has been dropped for being too slow
+DROPPED = object()
+
+
+class Subscription:
+    """A single connected client"""
+
+    def __init__(self, queue_size):
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = False
+
+    async def get(self, timeout=None):
+        """Wait for the next event; returns None on timeout, DROPPED if dropped"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class NotificationBroker:
+    """Fan-out of events to every subscribed client"""
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._loop = None
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def subscribe(self):
+        """Register a new client (must be called from the event loop)"""
+        self._loop = asyncio.get_running_loop()
+        subscription = Subscription(self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event):
+        """Send an event to every client. Safe to call from any thread."""
+        if not self._subscribers or self._loop is None or self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(self._fan_out, event)
+
+    def _fan_out(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self._drop(subscription)
+
+    def _drop(self, subscription):
+        """Disconnect a slow consumer: empty its queue and leave only the DROPPED marker"""
+        self.unsubscribe(subscription)
+        subscription.dropped = True
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(DROPPED)
@@ -17,6 +17,10 @@ echo.
 echo Initializing database...
 python init_db.py
 
+echo.
+echo Building static assets...
+python build_assets.py
+
 echo.
 echo Starting FastAPI server on http://localhost:8000
 echo.
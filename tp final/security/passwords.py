@@ -0,0 +1,134 @@
+"""
+تشفير كلمات المرور - Password hashing
+
+Passwords are stored as "scrypt$<n>$<r>$<p>$<salt>$<hash>" (hashlib.scrypt,
+standard library). A KDF is deliberately slow (tens of milliseconds), so
+PasswordHasher runs it on a bounded thread pool: OpenSSL releases the GIL
+while hashing, the event loop keeps serving other requests, and at most
+`workers` hashes run at once during a login storm.
+
+Rows written before hashing was introduced still hold the plaintext
+password. verify() accepts them and reports that the row needs a rehash, so
+accounts migrate the first time their owner logs in.
+
+LoginThrottle is the per-username negative cache: after max_failures wrong
+passwords within `window` seconds the username is refused without running
+the KDF until the window expires.
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+SCHEME = "scrypt"
+DEFAULT_N = 2 ** 14
+DEFAULT_R = 8
+DEFAULT_P = 1
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+
+def hash_password(password, n=DEFAULT_N, r=DEFAULT_R, p=DEFAULT_P):
+    """Hash a password (blocking) and return the encoded string"""
+    salt = os.urandom(SALT_BYTES)
+    key = hashlib.scrypt(password.encode("utf-8"), salt=salt, n=n, r=r, p=p, dklen=KEY_BYTES)
+    return "$".join((
+        SCHEME, str(n), str(r), str(p),
+        base64.b64encode(salt).decode("ascii"),
+        base64.b64encode(key).decode("ascii"),
+    ))
+
+
+def is_hashed(stored):
+    return stored.startswith(SCHEME + "$")
+
+
+def verify_password(password, stored, n=DEFAULT_N, r=DEFAULT_R, p=DEFAULT_P):
+    """
+    Check a password against a stored value (blocking).
+    Returns (matches, needs_rehash); needs_rehash is True for plaintext rows
+    and hashes made with other parameters than (n, r, p).
+    """
+    if not is_hashed(stored):
+        # Legacy plaintext row
+        return hmac.compare_digest(password.encode("utf-8"), stored.encode("utf-8")), True
+    try:
+        _, n_s, r_s, p_s, salt_b64, key_b64 = stored.split("$")
+        params = (int(n_s), int(r_s), int(p_s))
+        salt = base64.b64decode(salt_b64)
+        expected = base64.b64decode(key_b64)
+    except ValueError:
+        return False, False
+    key = hashlib.scrypt(password.encode("utf-8"), salt=salt, n=params[0], r=params[1], p=params[2],
+                         dklen=len(expected))
+    return hmac.compare_digest(key, expected), params != (n, r, p)
+
+
+class PasswordHasher:
+    """Runs the KDF on a bounded thread pool so it never blocks the event loop"""
+
+    def __init__(self, workers=4, n=DEFAULT_N, r=DEFAULT_R, p=DEFAULT_P):
+        self.workers = workers
+        self.params = (n, r, p)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="kdf")
+        self._dummy_hash = None
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+
+    async def hash(self, password):
+        return await self._run(hash_password, password, *self.params)
+
+    async def verify(self, password, stored):
+        """(matches, needs_rehash) - see verify_password"""
+        return await self._run(verify_password, password, stored, *self.params)
+
+    async def verify_missing_user(self, password):
+        """
+        Spend the same KDF time for an unknown username as for a wrong
+        password, so response time does not reveal which usernames exist.
+        """
+        if self._dummy_hash is None:
+            self._dummy_hash = await self.hash("")
+        await self.verify(password, self._dummy_hash)
+        return False, False
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+
+
+class LoginThrottle:
+    """Per-username failed-login counter (bounded LRU, used from the event loop)"""
+
+    def __init__(self, max_failures=5, window=300.0, max_size=10000):
+        self.max_failures = max_failures
+        self.window = window
+        self.max_size = max_size
+        # username -> (failures, window end)
+        self._failures = OrderedDict()
+
+    def blocked(self, username):
+        entry = self._failures.get(username)
+        if entry is None:
+            return False
+        if entry[1] <= time.monotonic():
+            del self._failures[username]
+            return False
+        return entry[0] >= self.max_failures
+
+    def record_failure(self, username):
+        now = time.monotonic()
+        failures, until = self._failures.get(username, (0, 0.0))
+        if until <= now:
+            failures, until = 0, now + self.window
+        self._failures[username] = (failures + 1, until)
+        self._failures.move_to_end(username)
+        if len(self._failures) > self.max_size:
+            self._failures.popitem(last=False)
+
+    def reset(self, username):
+        self._failures.pop(username, None)
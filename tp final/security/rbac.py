@@ -0,0 +1,150 @@
+"""
+جدول الصلاحيات المُجمّع - Compiled role-based access control
+
+The nested ROLE_PERMISSIONS dict is compiled once into a frozen table: a
+set of allowed (role, resource, action) tuples for allows() and a bitmask
+of actions per role and resource for require(), so a permission check is
+one or two hash lookups instead of a scan of an action list.
+
+The policy can be overridden by a JSON file with the same shape as
+ROLE_PERMISSIONS. A background thread re-reads the file when its
+modification time changes, so policy edits apply without restarting
+workers. A file that is not valid JSON of that shape is logged and ignored.
+"""
+import json
+import logging
+import os
+import threading
+from types import MappingProxyType
+
+from fastapi import Depends, HTTPException, Request
+
+logger = logging.getLogger(__name__)
+
+ACTIONS = ("read", "write", "update", "delete")
+ACTION_BITS = MappingProxyType({action: 1 << i for i, action in enumerate(ACTIONS)})
+_NO_MASKS = {}
+
+
+class PermissionTable:
+    """Immutable role -> resource -> action bitmask table"""
+
+    def __init__(self, role_permissions):
+        """
+        role_permissions: {role: {resource: [action, ...]}}; any other shape
+        (or an unknown action) raises ValueError
+        """
+        if not isinstance(role_permissions, dict):
+            raise ValueError("RBAC policy must be an object of roles")
+        masks = {}
+        allowed = set()
+        for role, resources in role_permissions.items():
+            if not isinstance(resources, dict):
+                raise ValueError(f"Permissions of role '{role}' must be an object of resources")
+            role_masks = {}
+            for resource, actions in resources.items():
+                if not isinstance(actions, (list, tuple)):
+                    raise ValueError(f"Actions for {role}/{resource} must be a list")
+                mask = 0
+                for action in actions:
+                    if not isinstance(action, str) or action not in ACTION_BITS:
+                        raise ValueError(f"Unknown action {action!r} for {role}/{resource}")
+                    mask |= ACTION_BITS[action]
+                    allowed.add((role, resource, action))
+                role_masks[resource] = mask
+            masks[role] = role_masks
+        # Read-only view for callers; lookups use the plain dicts (a proxy adds a layer per call)
+        self.masks = MappingProxyType({role: MappingProxyType(m) for role, m in masks.items()})
+        self._role_masks = masks.get
+        # allows() is one set lookup on the (role, resource, action) tuple
+        self._allowed = frozenset(allowed)
+
+    def allows(self, role, resource, action):
+        return (role, resource, action) in self._allowed
+
+    def check(self, role, resource, bit):
+        """Same as allows() with the action already converted to its bit"""
+        return self._role_masks(role, _NO_MASKS).get(resource, 0) & bit != 0
+
+
+class PolicyStore:
+    """
+    Holds the current PermissionTable and reloads it from policy_file when
+    the file changes. A daemon thread checks the file every check_interval
+    seconds, so permission checks never stat() it themselves. Without a
+    policy file the default permissions are used.
+    """
+
+    def __init__(self, default_permissions, policy_file=None, check_interval=2.0):
+        self.default_table = PermissionTable(default_permissions)
+        self.policy_file = policy_file
+        self.check_interval = check_interval
+        self._use(self.default_table)
+        self._mtime = None
+        self._stop = threading.Event()
+        self.reload_if_changed()
+        if policy_file:
+            threading.Thread(target=self._watch, name="rbac-policy", daemon=True).start()
+
+    def _use(self, table):
+        self.table = table
+        # allows() is the table's own bound method: no extra call per check
+        self.allows = table.allows
+
+    def _watch(self):
+        while not self._stop.wait(self.check_interval):
+            try:
+                self.reload_if_changed()
+            except Exception:
+                logger.exception("RBAC policy check failed")
+
+    def close(self):
+        """Stop watching the policy file"""
+        self._stop.set()
+
+    def reload_if_changed(self):
+        if not self.policy_file:
+            return
+        try:
+            mtime = os.stat(self.policy_file).st_mtime
+        except OSError:
+            # Policy file removed (or never created): fall back to the defaults
+            if self._mtime is not None:
+                self._use(self.default_table)
+                self._mtime = None
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.policy_file, encoding="utf-8") as f:
+                table = PermissionTable(json.load(f))
+        except (OSError, ValueError) as e:
+            # Keep serving the previous policy rather than locking everyone out
+            logger.error("Ignoring invalid RBAC policy file %s: %s", self.policy_file, e)
+            self._mtime = mtime
+            return
+        self._use(table)
+        self._mtime = mtime
+        logger.info("Loaded RBAC policy from %s", self.policy_file)
+
+    def allows(self, role, resource, action):
+        """Replaced per instance by the current table's allows (see _use)"""
+        return self.table.allows(role, resource, action)
+
+    def require(self, resource, action, detail=None):
+        """
+        FastAPI dependency: the current user (set by AuthMiddleware) must be
+        allowed to perform action on resource, otherwise 403.
+        Usage: user: dict = policy.require("patients", "read")
+        """
+        bit = ACTION_BITS[action]
+        message = detail or f"Access denied - No permission to {action} {resource}"
+
+        # async so FastAPI runs it inline instead of in the threadpool
+        async def dependency(request: Request):
+            user = request.scope.get("user")
+            if not user or not self.table.check(user["role"], resource, bit):
+                raise HTTPException(status_code=403, detail=message)
+            return user
+
+        return Depends(dependency)
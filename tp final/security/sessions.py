@@ -0,0 +1,124 @@
+"""
+رموز الجلسات الموقّعة - Signed session tokens
+
+/login issues a token "<payload>.<signature>": the payload is the base64url
+JSON {"u": username, "r": role, "i": user id, "v": session version,
+"exp": unix time} and the signature is its HMAC-SHA256 under SESSION_SECRET.
+The server keeps no session store; any worker that knows the secret can
+verify a token.
+
+Verified tokens are kept in a bounded LRU keyed by the raw token string, so
+after the first request a session costs one dict lookup and an expiry
+comparison instead of base64 + JSON + HMAC.
+
+Revocation: users.session_version goes up on logout and role change, and a
+deleted user has none. A token is refused once its "v" no longer matches.
+The current version of each user is looked up at most once per recheck
+seconds per worker; forget() drops it at once after a local change, other
+workers notice within recheck seconds.
+"""
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import time
+from collections import OrderedDict
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+class SessionManager:
+    """Issues and verifies signed session tokens, caching verified ones"""
+
+    def __init__(self, secret, ttl=8 * 3600, cache_size=4096, session_version=None, recheck=5.0):
+        """
+        secret: HMAC key (str or bytes), shared by every worker
+        ttl: token lifetime in seconds
+        cache_size: most verified tokens (and user versions) kept in memory
+        session_version: async session_version(user_id) -> the user's current
+            version, or None when the user no longer exists (None: tokens are
+            never revoked)
+        recheck: seconds a looked-up version is trusted
+        """
+        self._key = secret.encode("utf-8") if isinstance(secret, str) else secret
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.session_version = session_version
+        self.recheck = recheck
+        # token -> (user dict, expires at, session version); only touched from the event loop
+        self._cache = OrderedDict()
+        # user id -> (session version or None, trusted until); forget() may run in other threads
+        self._versions = {}
+
+    def _sign(self, payload):
+        return _b64encode(hmac.new(self._key, payload.encode("utf-8"), hashlib.sha256).digest())
+
+    def issue(self, username, role, user_id=None, version=0):
+        """Create a token for the user, valid for ttl seconds (or until its version is bumped)"""
+        claims = {"u": username, "r": role, "exp": int(time.time()) + self.ttl}
+        if user_id is not None:
+            claims["i"] = user_id
+            claims["v"] = version
+        payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+        return f"{payload}.{self._sign(payload)}"
+
+    async def verify(self, token):
+        """Return {"id", "username", "role"} for a valid, unexpired, unrevoked token, else None"""
+        entry = self._cache.get(token)
+        if entry is not None:
+            if entry[1] <= time.time():
+                del self._cache[token]
+                return None
+            self._cache.move_to_end(token)
+        else:
+            user, expires, version = self._decode(token)
+            if user is None or expires <= time.time():
+                return None
+            entry = self._cache[token] = (user, expires, version)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        user, _, version = entry
+        if self.session_version is not None and not await self._is_current(user["id"], version):
+            # versions only go up: the token can never become valid again
+            self._cache.pop(token, None)
+            return None
+        return user
+
+    async def _is_current(self, user_id, version):
+        if user_id is None:
+            return False
+        cached = self._versions.get(user_id)
+        now = time.monotonic()
+        if cached is not None and cached[1] > now:
+            current = cached[0]
+        else:
+            current = await self.session_version(user_id)
+            if len(self._versions) >= self.cache_size:
+                self._versions.clear()
+            self._versions[user_id] = (current, now + self.recheck)
+        return current is not None and current == version
+
+    def forget(self, *user_ids):
+        """Look the versions of these users up again on their next request"""
+        for user_id in user_ids:
+            self._versions.pop(user_id, None)
+
+    def _decode(self, token):
+        payload, _, signature = token.partition(".")
+        expected = self._sign(payload).encode("ascii")
+        if not signature or not hmac.compare_digest(signature.encode("utf-8"), expected):
+            return None, 0, None
+        try:
+            claims = json.loads(_b64decode(payload))
+            user = {"id": claims.get("i"), "username": claims["u"], "role": claims["r"]}
+            return user, float(claims["exp"]), claims.get("v")
+        except (binascii.Error, ValueError, KeyError, TypeError, AttributeError):
+            return None, 0, None
@@ -0,0 +1,71 @@
+"""
+ترميز JSON السريع - Fast JSON responses
+
+FastJSONResponse encodes with the fastest library available: orjson, then
+msgspec, then the standard json module (compact separators, UTF-8 output).
+Set JSON_BACKEND=orjson|msgspec|json to force one.
+
+RawJSON wraps text that is already valid JSON (for example rows that
+SQLite encoded with json_object). It can be used as a top-level value of
+the response dict and is copied into the body as-is, so large row lists
+are never turned into Python dicts nor encoded again.
+"""
+import json
+import os
+
+from fastapi.responses import JSONResponse
+
+
+def _stdlib_dumps(content):
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _load_backend(name):
+    if name == "orjson":
+        import orjson
+        return lambda content: orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    if name == "msgspec":
+        import msgspec
+        return msgspec.json.Encoder().encode
+    return _stdlib_dumps
+
+
+def _select_backend():
+    forced = os.environ.get("JSON_BACKEND")
+    if forced:
+        return forced, _load_backend(forced)
+    for name in ("orjson", "msgspec"):
+        try:
+            return name, _load_backend(name)
+        except ImportError:
+            continue
+    return "json", _stdlib_dumps
+
+
+JSON_BACKEND, dumps = _select_backend()
+
+
+class RawJSON:
+    """Pre-encoded JSON text (str or UTF-8 bytes) to embed in a response"""
+
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        self.data = data.encode("utf-8") if isinstance(data, str) else data
+
+    def __len__(self):
+        return len(self.data)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse using the fastest available encoder; accepts RawJSON values"""
+
+    def render(self, content):
+        if isinstance(content, RawJSON):
+            return content.data
+        if isinstance(content, dict) and any(isinstance(value, RawJSON) for value in content.values()):
+            return b"{" + b",".join(
+                dumps(key) + b":" + (value.data if isinstance(value, RawJSON) else dumps(value))
+                for key, value in content.items()
+            ) + b"}"
+        return dumps(content)
@@ -1,10 +1,13 @@
 import requests
 
+# Login as admin to get a session token
+login = requests.post("http://localhost:8000/login", data={"username": "admin", "password": "admin123"})
+token = login.json()["token"]
+
 # Test adding a user
 url = "http://localhost:8000/api/admin/users"
 headers = {
-    "X-User-Role": "Admin",
-    "X-User-Name": "admin"
+    "Authorization": f"Bearer {token}"
 }
 data = {
     "username": "testnurse",